@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Import-time benchmark. Run from the repository root with:
+python -m bench.bench_import
+"""
+import subprocess
+import sys
+import time
+
+
+STATEMENTS = [
+    "import itemie.core",
+    "import itemie",
+    "import itemie.analyse",
+]
+
+
+def time_import(statement, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    baseline = time_import("pass")
+    for statement in STATEMENTS:
+        t = time_import(statement) - baseline
+        print(f"{statement:<30} {t * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Throughput benchmark for the text converters on 1M free-text responses.
+Run from the repository root with: python -m bench.bench_text [n]
+"""
+import sys
+import time
+
+import numpy as np
+
+from itemie.core import convert
+
+
+PHRASES = [
+    "good service",
+    "slow delivery",
+    "friendly staff",
+    "too expensive",
+    "easy to use",
+    "poor packaging",
+]
+SPLITS = [",", ";", " and ", "/"]
+KEYVALS = {"&": "and", "w/": "with", "svc": "service", "  ": " "}
+
+
+def make_responses(n, seed=0):
+    rng = np.random.default_rng(seed)
+    seps = np.array([", ", "; ", " and ", " / "])
+    first = rng.choice(PHRASES, n)
+    second = rng.choice(PHRASES, n)
+    sep = rng.choice(seps, n)
+    return np.char.add(np.char.add(first, sep), second).astype(object)
+
+
+def run(label, converter, data):
+    start = time.perf_counter()
+    converter.convert(data)
+    t = time.perf_counter() - start
+    print(f"{label:<24} {t:7.2f} s  {len(data) / t / 1e6:6.2f} M rows/s")
+
+
+def main(n=1_000_000):
+    data = make_responses(n)
+    run("StrReplace", convert.StrReplace(KEYVALS), data)
+    run("StrReplace bulk", convert.StrReplace(KEYVALS, bulk=True), data)
+    run("Splitter", convert.Splitter(SPLITS), data)
+    run("Splitter bulk", convert.Splitter(SPLITS, bulk=True), data)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
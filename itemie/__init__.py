@@ -4,7 +4,22 @@ Created on Wed Oct 18 18:54:17 2023
 
 @author: Reuben
 """
+import importlib
+
 from . import core
 from . import utils
-from . import analyse
-from . import report
\ No newline at end of file
+
+# Optional subpackages are imported on first attribute access
+_LAZY_SUBMODULES = ['analyse', 'report']
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
+
+
+def __dir__():
+    return sorted(list(globals()) + _LAZY_SUBMODULES)
@@ -6,80 +6,301 @@ Created on Wed Oct 25 21:10:58 2023
 """
 
 
-import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+from pathlib import Path
 import numpy as np
-import spacy 
-# from spacy import displacy
+import pandas as pd
+
+
+# spaCy, gensim and pyLDAvis are heavy to import and spaCy's model is slow
+# to load, so they are only imported the first time Topics needs them.
+_NLP = None
+MODEL = 'en_core_web_sm'
+EXTRA_STOPWORDS = ['nan', '$']
+# Topics only uses the tokens, their lexical flags and lemmas, so these
+# components are never run. The lemmatiser needs the tagger's POS tags.
+UNUSED_PIPES = ['parser', 'ner']
+LEMMA_PIPES = ['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer']
+
+# Preprocessed (texts, dictionary, corpus), keyed by a hash of the inputs
+# and settings, so refitting with other topic counts or seeds skips spaCy
+_CORPORA = OrderedDict()
+CORPUS_CACHE_SIZE = 4
+# Every stopword added to the shared pipeline, which is part of the cache key
+_STOPWORDS = set(EXTRA_STOPWORDS)
+
+
+def get_nlp():
+    """ Return the shared spaCy pipeline, loading it on first use """
+    global _NLP
+    if _NLP is None:
+        import spacy
+        _NLP = spacy.load(MODEL)
+        add_stopwords(EXTRA_STOPWORDS, _NLP)
+    return _NLP
+
+
+def train_lda(corpus, dictionary, num_topics, random_state=0, workers=None):
+    """ Train an LDA model, with LdaMulticore if workers is given """
+    if workers is None:
+        from gensim.models import LdaModel
+        return LdaModel(corpus=corpus, num_topics=num_topics,
+                        id2word=dictionary, random_state=random_state)
+    from gensim.models import LdaMulticore
+    return LdaMulticore(corpus=corpus, num_topics=num_topics,
+                        id2word=dictionary, random_state=random_state,
+                        workers=workers)
+
 
-import gensim
-from gensim.corpora import Dictionary
-from gensim import models
-from gensim.models import LdaModel, CoherenceModel, LsiModel, HdpModel
+def coherence(model, texts, dictionary, typ='c_v', processes=-1):
+    from gensim.models import CoherenceModel
+    coherence_model_lda = CoherenceModel(
+        model=model, texts=texts, dictionary=dictionary, coherence=typ,
+        processes=processes)
+    return coherence_model_lda.get_coherence()
 
-import pyLDAvis
-import pyLDAvis.gensim_models
 
+# The corpus a sweep worker trains on, sent once per worker process
+_SWEEP = None
 
-nlp = spacy.load('en_core_web_sm')
 
+def _init_sweep(corpus, dictionary, texts):
+    global _SWEEP
+    _SWEEP = (corpus, dictionary, texts)
 
-def add_stopwords(stopwords):
+
+def _fit_and_score(num_topics, random_state, typ, workers):
+    corpus, dictionary, texts = _SWEEP
+    model = train_lda(corpus, dictionary, num_topics, random_state, workers)
+    # Each sweep worker scores its own model, so don't nest processes
+    score = coherence(model, texts, dictionary, typ, processes=1)
+    return score, model
+
+
+def clear_cache():
+    """ Forget the preprocessed corpora held in memory """
+    _CORPORA.clear()
+
+
+def add_stopwords(stopwords, nlp=None):
+    nlp = get_nlp() if nlp is None else nlp
+    if nlp is _NLP:
+        _STOPWORDS.update(stopwords)
     for stopword in stopwords:
         lexeme = nlp.vocab[stopword]
         lexeme.is_stop = True
 
-extra_stopwords = ['nan', '$']
-add_stopwords(extra_stopwords)
-
 
 class Topics:
-    def __init__(self, lemmatize=True, tfidf=True):
+    """ Topic models of free-text responses
+
+    Args:
+        lemmatize (bool): Use word lemmas rather than the words.
+        tfidf (bool): Weight the corpus by TF-IDF.
+        n_process (int): The number of processes spaCy uses. -1 uses every
+            CPU.
+        batch_size (int): The number of responses spaCy processes per batch.
+        dedupe (bool): Only process each distinct response once, which
+            helps when many responses are identical.
+        cache_dir (str): Optional folder to also cache preprocessed
+            corpora in, with the corpus in Matrix Market format.
+        workers (int): Optionally train each model with LdaMulticore using
+            this many worker processes.
+    """
+
+    def __init__(self, lemmatize=True, tfidf=True, n_process=1,
+                 batch_size=1000, dedupe=False, cache_dir=None, workers=None):
         self._lemmatize = lemmatize
         self._tfidf = tfidf
+        self._n_process = n_process
+        self._batch_size = batch_size
+        self._dedupe = dedupe
+        self._cache_dir = None if cache_dir is None else Path(cache_dir)
+        self._workers = workers
+
+    @property
+    def nlp(self):
+        return get_nlp()
                 
     def setup(self, item, num_topics=5, data=None, random_state=0):
         data = item.values('default') if data is None else data
         lin_data, mapping = item.linearised(data)
-        texts = self._get_texts(lin_data)
-        dictionary, corpus = self._make_corpus(texts)
+        texts, dictionary, corpus = self.preprocess(lin_data)
+        model = self._make_topic_model(corpus, num_topics, dictionary, random_state)
+        self._set_model(model, num_topics, texts, dictionary, corpus, mapping)
+
+    def _set_model(self, model, num_topics, texts, dictionary, corpus,
+                   mapping):
         self._num_topics = num_topics
         self._texts = texts
-        model = self._make_topic_model(corpus, num_topics, dictionary, random_state)
         self._dictionary = dictionary
         self._corpus = corpus
         self._model = model
         self._mapping = mapping
 
+    def sweep(self, item, num_topics=(5,), seeds=(0,), data=None, typ='c_v',
+              n_jobs=None):
+        """ Fit models for several topic counts and seeds and rank them
+
+        Every model shares one preprocessed corpus. Models are trained and
+        scored concurrently in a process pool, and only the best model is
+        kept, which is then used as if set up with its settings.
+
+        Args:
+            item (MultiCodedItem): The item with the responses.
+            num_topics (list[int]): The topic counts to try.
+            seeds (list[int]): The random states to try.
+            data (list): Optional responses to use instead of the item's.
+            typ (str): The coherence measure to rank by.
+            n_jobs (int): The number of processes. None uses every CPU, and
+                1 fits the models one at a time in this process.
+
+        Returns:
+            pd.DataFrame: The num_topics, random_state and coherence of
+            every model, best first, with any NaN scores last.
+        """
+        data = item.values('default') if data is None else data
+        lin_data, mapping = item.linearised(data)
+        texts, dictionary, corpus = self.preprocess(lin_data)
+        params = [(n, seed) for n in num_topics for seed in seeds]
+        rows = []
+        best = None
+        for (n, seed), (score, model) in self._sweep_models(
+                params, typ, n_jobs, corpus, dictionary, texts):
+            rows.append((n, seed, score))
+            # A failed score (NaN) ranks below every real one
+            rank = -np.inf if np.isnan(score) else score
+            if best is None or rank > best[0]:
+                best = (rank, n, model)
+            model = None  # let a worse model be freed before the next
+        self._set_model(best[2], best[1], texts, dictionary, corpus, mapping)
+        df = pd.DataFrame(rows, columns=['num_topics', 'random_state',
+                                         'coherence'])
+        return df.sort_values('coherence', ascending=False,
+                              ignore_index=True)
+
+    def _sweep_models(self, params, typ, n_jobs, corpus, dictionary, texts):
+        """ Yield the settings, score and model of each fit as it ends """
+        if n_jobs == 1:
+            _init_sweep(corpus, dictionary, texts)
+            try:
+                for n, seed in params:
+                    yield (n, seed), _fit_and_score(n, seed, typ,
+                                                    self._workers)
+            finally:
+                _init_sweep(None, None, None)
+            return
+        with ProcessPoolExecutor(n_jobs, initializer=_init_sweep,
+                                 initargs=(corpus, dictionary, texts)) as ex:
+            futures = {ex.submit(_fit_and_score, n, seed, typ,
+                                 self._workers): (n, seed)
+                       for n, seed in params}
+            for future in as_completed(futures):
+                # Drop each future once read, so worse models are freed
+                yield futures.pop(future), future.result()
+
     @property
     def mapping(self):
         return self._mapping
 
+    def _cache_key(self, lin_data):
+        settings = [MODEL, sorted(_STOPWORDS), self._lemmatize, self._tfidf]
+        h = hashlib.sha256(json.dumps(settings).encode('utf-8'))
+        for text in lin_data:
+            h.update(str(text).encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def preprocess(self, lin_data):
+        """ Return the texts, dictionary and corpus for some responses
+
+        Results are cached in memory, and in cache_dir if given, keyed by a
+        hash of the responses and the preprocessing settings.
+        """
+        key = self._cache_key(lin_data)
+        cached = _CORPORA.get(key)
+        if cached is None and self._cache_dir is not None:
+            cached = self._load_cached(self._cache_dir / key)
+        if cached is None:
+            texts = self._get_texts(lin_data)
+            dictionary, corpus = self._make_corpus(texts)
+            cached = (texts, dictionary, corpus)
+            if self._cache_dir is not None:
+                self._save_cached(self._cache_dir / key, cached)
+        _CORPORA[key] = cached
+        _CORPORA.move_to_end(key)
+        while len(_CORPORA) > CORPUS_CACHE_SIZE:
+            _CORPORA.popitem(last=False)
+        return cached
+
+    @staticmethod
+    def _save_cached(folder, cached):
+        from gensim.corpora import MmCorpus
+        texts, dictionary, corpus = cached
+        folder.mkdir(parents=True, exist_ok=True)
+        with open(folder / 'texts.json', 'w', encoding='utf-8') as f:
+            json.dump(texts, f)
+        dictionary.save(str(folder / 'dictionary'))
+        MmCorpus.serialize(str(folder / 'corpus.mm'), corpus)
+
+    @staticmethod
+    def _load_cached(folder):
+        if not (folder / 'corpus.mm').exists():
+            return None
+        from gensim.corpora import Dictionary, MmCorpus
+        with open(folder / 'texts.json', encoding='utf-8') as f:
+            texts = json.load(f)
+        dictionary = Dictionary.load(str(folder / 'dictionary'))
+        return texts, dictionary, MmCorpus(str(folder / 'corpus.mm'))
+
+    def _disabled(self):
+        """ Return the pipeline components that are not needed """
+        unused = UNUSED_PIPES if self._lemmatize else UNUSED_PIPES + LEMMA_PIPES
+        return [name for name in self.nlp.pipe_names if name in unused]
+
+    def _tokens(self, doc):
+        attr = 'lemma_' if self._lemmatize else 'text'
+        # Stopwords added at runtime are lexeme flags, which worker
+        # processes may not share, so they are also checked by text
+        return [getattr(word, attr) for word in doc
+                if word.text != '\n' and not word.is_stop
+                and word.lower_ not in _STOPWORDS
+                and not word.is_punct and not word.like_num
+                and word.text != 'I']
+
     def _get_texts(self, lin_data):
-        texts = []
-        for text in nlp.pipe(lin_data):
-            response = []
-            for word in text:
-                if word.text != '\n' and not word.is_stop and not word.is_punct\
-                                 and not word.like_num and word.text != 'I':
-                     to_append = word.lemma_ if self._lemmatize else word.text
-                     response.append(to_append)
-            texts.append(response)
+        if self._dedupe:
+            codes, lin_data = pd.factorize(np.asarray(lin_data, dtype=object),
+                                           use_na_sentinel=False)
+        docs = self.nlp.pipe(lin_data, n_process=self._n_process,
+                             batch_size=self._batch_size,
+                             disable=self._disabled())
+        texts = [self._tokens(doc) for doc in docs]
+        if self._dedupe:
+            texts = [texts[code] for code in codes]
         texts = self._make_bigrams(texts)
         return texts
 
     def _make_bigrams(self, texts):
-        bigram = gensim.models.phrases.Phrases(texts)
+        from gensim.models.phrases import Phrases
+        bigram = Phrases(texts)
         texts = [bigram[line] for line in texts]
         texts = [bigram[line] for line in texts]
         return texts
 
     def _make_corpus(self, texts):
+        from gensim.corpora import Dictionary
+        from gensim import models
         dictionary = Dictionary(texts)
         corpus = [dictionary.doc2bow(text) for text in texts]
         
         if self._tfidf:
             tfidf = models.TfidfModel(corpus)
-            corpus = tfidf[corpus]
+            # Weight once, rather than every time the corpus is iterated
+            corpus = list(tfidf[corpus])
         return dictionary, corpus
 
     def _make_topic_model(self, corpus, num_topics, dictionary, random_state):
@@ -89,12 +310,13 @@ class Topics:
         #hdp_model = HdpModel(corpus=corpus_tfidf, id2word=dictionary)
         #hdp_model.show_topics()[:5]
         
-        lda_model = LdaModel(corpus=corpus, num_topics=num_topics, id2word=dictionary,
-                             random_state=random_state)
+        lda_model = train_lda(corpus, dictionary, num_topics, random_state,
+                              self._workers)
         # lda_model.show_topics()
         return lda_model
 
     def get_prepared(self):
+        import pyLDAvis.gensim_models
         lda_model = self._model
         corpus = self._corpus
         dictionary = self._dictionary
@@ -102,10 +324,12 @@ class Topics:
         return prepared
 
     def to_panel(self):
+        import pyLDAvis
         prepared = self.get_prepared()
         return pyLDAvis.display(prepared)
 
     def to_html(self, fname=None):
+        import pyLDAvis
         prepared = self.get_prepared()
         if fname is None:
             return pyLDAvis.prepared_data_to_html(prepared)
@@ -133,6 +357,4 @@ class Topics:
         return lst
     
     def get_coherence(self, typ='c_v'):
-        coherence_model_lda = CoherenceModel(
-           model=self._model, texts=self._texts, dictionary=self._dictionary, coherence=typ)
-        return coherence_model_lda.get_coherence()
\ No newline at end of file
+        return coherence(self._model, self._texts, self._dictionary, typ)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Indicator matrices for coded multi-response answers."""
+
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+from .dtypes import smallest_int
+
+SCIPY_LOADED = find_spec("scipy") is not None
+
+
+class Indicators:
+    """ A responses × codes indicator matrix for multi-coded responses
+
+    Codes are scattered straight into the matrix, which is a compact bool
+    array or, if sparse, a scipy.sparse CSC matrix. Wide tables are only
+    built when asked for.
+
+    Args:
+        rows (array-like): The response index of each coded phrase.
+        codes (array-like): The code of each coded phrase. Missing codes
+            are ignored.
+        exclude (list): Codes to leave out.
+        sparse (bool): If True, store a scipy.sparse matrix.
+    """
+
+    def __init__(self, rows, codes, exclude=None, sparse=False):
+        if sparse and not SCIPY_LOADED:
+            raise ModuleNotFoundError("scipy package required.")
+        row_ids, row_labels = pd.factorize(pd.Series(rows), sort=True)
+        col_ids, col_labels = pd.factorize(pd.Series(codes), sort=True)
+        keep = col_ids >= 0
+        if exclude:
+            excluded = np.flatnonzero(np.isin(col_labels, list(exclude)))
+            keep &= ~np.isin(col_ids, excluded)
+            # Shift the remaining codes down past the excluded ones
+            col_ids = col_ids - np.searchsorted(excluded, col_ids)
+            col_labels = np.delete(np.asarray(col_labels), excluded)
+        self._row_labels = np.asarray(row_labels)
+        self._col_labels = np.asarray(col_labels)
+        shape = (len(self._row_labels), len(self._col_labels))
+        r = row_ids[keep]
+        c = col_ids[keep]
+        if sparse:
+            from scipy.sparse import csc_matrix
+            ones = np.ones(len(r), dtype=bool)
+            matrix = csc_matrix((ones, (r, c)), shape=shape)
+            matrix.sum_duplicates()
+        else:
+            matrix = np.zeros(shape, dtype=bool)
+            matrix[r, c] = True
+        self._matrix = matrix
+        self._sparse = sparse
+
+    @property
+    def row_labels(self):
+        return self._row_labels
+
+    @property
+    def codes(self):
+        return self._col_labels
+
+    @property
+    def matrix(self):
+        return self._matrix
+
+    @property
+    def sparse(self):
+        return self._sparse
+
+    def n_codes(self) -> np.ndarray:
+        """ Return the number of distinct codes for each response """
+        return np.asarray(self._matrix.sum(axis=1)).ravel()
+
+    @staticmethod
+    def _dtype(lo, hi, compact=False):
+        """ Return float, or if compact and lo and hi are whole numbers, the
+        smallest integer dtype holding them """
+        if compact and float(lo).is_integer() and float(hi).is_integer():
+            return smallest_int(min(lo, hi), max(lo, hi))[0]
+        return np.result_type(lo, hi, float)
+
+    def column(self, j, present_value=1, fill_value=0, sparse=None,
+               compact=False):
+        """ Return one code's column of present / fill values """
+        sparse = self._sparse if sparse is None else sparse
+        dtype = self._dtype(present_value, fill_value, compact)
+        if self._sparse and sparse and fill_value == 0:
+            col = self._matrix[:, [j]].astype(dtype) * present_value
+            return pd.arrays.SparseArray.from_spmatrix(col)
+        if self._sparse:
+            present = self._matrix[:, [j]].indices
+        else:
+            present = self._matrix[:, j]
+        values = np.full(len(self._row_labels), fill_value, dtype=dtype)
+        values[present] = present_value
+        if sparse:
+            return pd.arrays.SparseArray(values, fill_value=fill_value)
+        return values
+
+    def count(self, present_value=1, fill_value=0, compact=False):
+        """ Return each response's sum over its present / fill values """
+        k = self.n_codes()
+        n = len(self._col_labels)
+        count = k * present_value + (n - k) * fill_value
+        lo = n * min(present_value, fill_value, 0)
+        hi = n * max(present_value, fill_value, 0)
+        return count.astype(self._dtype(lo, hi, compact))
+
+    def iter_columns(self, prefix="", present_value=1, fill_value=0,
+                     sparse=None, compact=False):
+        """ Yield (name, values) for each code, then the count column """
+        for j, code in enumerate(self._col_labels):
+            yield prefix + str(code), self.column(
+                j, present_value, fill_value, sparse, compact)
+        yield prefix + "count", self.count(present_value, fill_value,
+                                           compact)
+
+    def to_df(self, prefix="", present_value=1, fill_value=0, sparse=None,
+              compact=False):
+        dct = dict(self.iter_columns(prefix, present_value, fill_value,
+                                     sparse, compact))
+        df = pd.DataFrame(dct, index=pd.Index(self._row_labels, name="index"))
+        return df
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Assemble collected item data into DataFrames and Arrow tables."""
+
+import numpy as np
+import pandas as pd
+
+from .ragged import Ragged
+
+
+def _column(values):
+    """ Return values as a column without copying where possible """
+    if isinstance(values, (pd.Series, pd.Index)):
+        # Drop the index so columns align by position, not by label
+        return values.array
+    if isinstance(values, Ragged):
+        return np.asarray(values)
+    return values
+
+
+def to_frame(dct: dict, keep_index=True) -> pd.DataFrame:
+    """ Build a DataFrame from collected columns in one step
+
+    Columns are aligned by position. If keep_index is True, the index of the
+    first Series, such as respondent IDs from the source data, labels the
+    rows.
+    """
+    index = None
+    if keep_index:
+        index = next((values.index for values in dct.values()
+                      if isinstance(values, pd.Series)), None)
+    columns = {name: _column(values) for name, values in dct.items()}
+    df = pd.DataFrame(columns, index=index, copy=False)
+    df.index.name = "response"
+    df.columns.name = "item"
+    return df
+
+
+def _arrow_column(values):
+    import pyarrow as pa
+    if isinstance(values, Ragged):
+        values_arr = pa.array(values.values)
+        offsets = pa.array(values.offsets.astype(np.int32))
+        return pa.ListArray.from_arrays(offsets, values_arr)
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.array
+    if isinstance(values, pd.arrays.SparseArray):
+        values = values.to_numpy()
+    return pa.array(values)
+
+
+def to_table(dct: dict):
+    """ Build a pyarrow Table from collected columns
+
+    Numeric columns are wrapped without copying, and Ragged columns become
+    list columns straight from their values and offsets.
+    """
+    import pyarrow as pa
+    names = list(dct)
+    arrays = [_arrow_column(dct[name]) for name in names]
+    return pa.table(arrays, names=names)
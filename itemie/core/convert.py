@@ -5,74 +5,322 @@ Created on Thu Oct 19 16:14:10 2023
 @author: Reuben
 """
 
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+import hashlib
+from importlib.util import find_spec
+import os
+import re
+import sqlite3
+import threading
+
 import numpy as np
+import pandas as pd
 
-TEXTBLOB_LOADED = True
-try:
-    from textblob import TextBlob
-except ModuleNotFoundError:
-    TEXTBLOB_LOADED = False
+from .ragged import Ragged
+
+# TextBlob pulls in nltk, so it is only imported when AutoCorrect runs.
+TEXTBLOB_LOADED = find_spec("textblob") is not None
+
+# Bulk string operations use Arrow string kernels when pyarrow is available.
+PYARROW_LOADED = find_spec("pyarrow") is not None
+STRING_DTYPE = "string[pyarrow]" if PYARROW_LOADED else object
 
 
 class BaseConverter:
+    # Element-wise converters can be fused into a single pass by Pipeline
+    elementwise = False
+    # Blockwise converters can convert several columns at once
+    blockwise = False
+
     def convert(self, data: np.ndarray) -> np.ndarray:
         raise NotImplementedError
 
+    def convert_block(self, columns: list) -> list:
+        """ Convert several columns, each exactly as convert would
+
+        Blockwise converters may share work between the columns.
+        """
+        return [self.convert(column) for column in columns]
+
     def __str__(self):
         return self._str()
 
     def _str(self, prefix=""):
         return prefix + self.__class__.__name__
 
+# Inferred kinds of object data that are safe to merge by equality. Mixed
+# kinds are not, as True, 1 and 1.0 compare equal but may convert
+# differently, and lists and other unhashable values cannot be factorised.
+_FACTORISABLE = {"string", "bytes", "integer", "floating", "boolean", "empty"}
+
+
+def _values(data) -> np.ndarray:
+    """ Return data as a 1-D array, without unpacking nested lists """
+    if isinstance(data, np.ndarray) and data.ndim == 1:
+        return data
+    if isinstance(data, (pd.Series, pd.Index)):
+        return np.asarray(data)
+    return np.fromiter(data, dtype=object, count=len(data))
+
+
+def _scalars(values) -> list:
+    """ Return the values as a list, with numbers and bools as Python
+    scalars, as converters see them when iterating a Series """
+    if values.dtype.kind in "biufc":
+        return values.tolist()
+    return list(values)
+
+
+def _factorise(data):
+    """ Return integer codes and the unique values of data
+
+    Missing values are kept as unique values (rather than a -1 code) so that
+    converters still see them. Each kind of missing value, such as None or
+    NaN, keeps its own code and object, exactly as it would be seen element
+    by element.
+
+    Returns None if the values cannot be safely factorised.
+    """
+    values = _values(data)
+    if (values.dtype == object and pd.api.types.infer_dtype(
+            values, skipna=True) not in _FACTORISABLE):
+        return None
+    codes, uniques = pd.factorize(values)
+    uniques = _scalars(uniques)
+    missing = codes < 0
+    if not missing.any():
+        return codes, uniques
+    if values.dtype != object:
+        codes[missing] = len(uniques)
+        uniques.extend(_scalars(values[missing][:1]))
+        return codes, uniques
+    # Object data may mix None, NaN, pd.NA, etc., so keep one of each type
+    found = values[missing]
+    kinds, _ = pd.factorize(np.array([type(v) for v in found], dtype=object))
+    _, first = np.unique(kinds, return_index=True)
+    codes[missing] = len(uniques) + kinds
+    uniques.extend(found[first])
+    return codes, uniques
+
+
+def _take(mapped, codes) -> np.ndarray:
+    """ Return mapped[codes] with a dtype inferred only from the values used,
+    as if the column had been converted on its own """
+    used = np.flatnonzero(np.bincount(codes, minlength=len(mapped)))
+    position = np.empty(len(mapped), dtype=np.intp)
+    position[used] = np.arange(len(used))
+    return np.array([mapped[i] for i in used])[position[codes]]
+
+
+def _cacheable(value) -> bool:
+    return pd.api.types.is_scalar(value) and not pd.isna(value)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class ElementwiseConverter(BaseConverter):
+    """ A converter that converts each value independently
+
+    Each distinct value is converted only once per call and the results are
+    scattered back over the data. If cache_size is given, converted values
+    are also kept in a bounded LRU cache that persists between calls, so it
+    is shared by every fit and transform (and every item) using this
+    converter.
+
+    Args:
+        cache_size (int): Maximum number of values to cache between calls.
+            None (default) disables the persistent cache.
+    """
+    elementwise = True
+    blockwise = True
+
+    def __init__(self, cache_size: int = None):
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        # Groups may convert items in threads that share this converter
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _convert_value(self, value):
+        raise NotImplementedError
+
+    def _cache_get(self, value):
+        """ Return (found, converted) for value from the persistent cache """
+        if not self._cache_size or not _cacheable(value):
+            return False, None
+        cache = self._cache
+        with self._lock:
+            if value in cache:
+                self._hits += 1
+                cache.move_to_end(value)
+                return True, cache[value]
+            self._misses += 1
+        return False, None
+
+    def _cache_put(self, value, out):
+        if not self._cache_size or not _cacheable(value):
+            return
+        cache = self._cache
+        with self._lock:
+            cache[value] = out
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+
+    def _lookup(self, value):
+        found, out = self._cache_get(value)
+        if not found:
+            out = self._convert_value(value)
+            self._cache_put(value, out)
+        return out
+
+    def _convert_uniques(self, uniques) -> list:
+        return [self._lookup(u) for u in uniques]
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._cache_size,
+                         len(self._cache))
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._hits = 0
+        self._misses = 0
+
+    def convert(self, data) -> np.ndarray:
+        factorised = _factorise(data)
+        if factorised is None:
+            return np.array(self._convert_uniques(_scalars(_values(data))))
+        codes, uniques = factorised
+        mapped = np.array(self._convert_uniques(uniques))
+        return mapped[codes]
+
+    def convert_block(self, columns: list) -> list:
+        """ Convert several columns, each exactly as convert would
+
+        Columns with the same dtype are factorised together, so each of
+        their unique values is converted only once.
+        """
+        if not self.elementwise:
+            return super().convert_block(columns)
+        out = [None] * len(columns)
+        by_dtype = {}
+        for j, column in enumerate(columns):
+            values = _values(column)
+            by_dtype.setdefault(values.dtype, []).append((j, values))
+        for group in by_dtype.values():
+            factorised = None
+            if len(group) > 1:
+                factorised = _factorise(np.concatenate([v for _, v in group]))
+            if factorised is None:
+                for j, values in group:
+                    out[j] = self.convert(values)
+                continue
+            codes, uniques = factorised
+            mapped = self._convert_uniques(uniques)
+            start = 0
+            for j, values in group:
+                out[j] = _take(mapped, codes[start:start + len(values)])
+                start += len(values)
+        return out
+
+
 class AsType(BaseConverter):
+    blockwise = True
+
     def __init__(self, typ):
         self._typ = typ
     
     def convert(self, data: np.ndarray) -> np.ndarray:
-        return np.array(data.astype(self._typ))
+        # Series.astype keeps missing values missing, e.g. for str
+        data = data if hasattr(data, "astype") else np.asarray(data)
+        return np.asarray(data.astype(self._typ))
 
 
-class Replace(BaseConverter):
-    def __init__(self, keyvals: dict, group_other=True, other_val='other'):
+class Replace(ElementwiseConverter):
+    def __init__(self, keyvals: dict, group_other=True, other_val='other',
+                 cache_size=None):
+        super().__init__(cache_size=cache_size)
         self._keyvals = keyvals
         self._group_other = group_other
         self._other_val = other_val
 
-    def convert(self, data) -> np.ndarray:
+    def _convert_value(self, k):
         dct = self._keyvals
-        out = []
-        for k in data:
-            if k in dct:
-                out.append(dct[k])
-            else:
-                if self._group_other:
-                    out.append(self._other_val)
-                else:
-                    out.append(k)
-        return np.array(out)
+        if k in dct:
+            return dct[k]
+        elif self._group_other:
+            return self._other_val
+        return k
+
+
+def _alternation(substrings) -> str:
+    """ Return a regex matching any of the substrings, longest first """
+    ordered = sorted(substrings, key=len, reverse=True)
+    return "|".join(re.escape(sub) for sub in ordered)
+
 
+def _as_strings(data) -> pd.Series:
+    return pd.Series(np.asarray(data, dtype=object), dtype=STRING_DTYPE)
 
-class StrReplace(BaseConverter):
-    def __init__(self, keyvals: dict):
+
+class StrReplace(ElementwiseConverter):
+    """ Replace substrings, applying all replacements in a single pass
+
+    Args:
+        keyvals (dict): Mapping of substrings to their replacements. Where
+            substrings overlap, the longest one is replaced.
+        bulk (bool): If True, operate on the whole column at once using
+            pandas string methods.
+        cache_size (int): See ElementwiseConverter.
+    """
+    def __init__(self, keyvals: dict, bulk=False, cache_size=None):
+        super().__init__(cache_size=cache_size)
         self._keyvals = keyvals
+        self._bulk = bulk
+        self._pattern = re.compile(_alternation(keyvals)) if keyvals else None
 
-    def convert(self, data) -> np.ndarray:
-        dct = self._keyvals
-        out = []
-        for s in data:
-            s2 = s
-            for substring, replacement in dct.items():
-                s2 = (s.replace(substring, replacement)) 
-            out.append(s2)
-        return np.array(out)
+    def _sub(self, match):
+        return self._keyvals[match.group(0)]
 
+    @property
+    def elementwise(self):
+        return not self._bulk
 
-class Function(BaseConverter):
-    def __init__(self, func):
-        self._func = func
+    def _convert_value(self, s: str) -> str:
+        if self._pattern is None:
+            return s
+        return self._pattern.sub(self._sub, s)
 
     def convert(self, data) -> np.ndarray:
-        return np.array([self._func(val) for val in data])
+        if self._pattern is None:
+            return np.array(data)
+        if self._bulk:
+            series = _as_strings(data).str.replace(
+                self._pattern, self._sub, regex=True
+            )
+            return series.to_numpy(dtype=object)
+        return super().convert(data)
+
+
+class Function(ElementwiseConverter):
+    def __init__(self, func, cache_size=None):
+        super().__init__(cache_size=cache_size)
+        self._func = func
+
+    def _convert_value(self, value):
+        return self._func(value)
 
 
 class VectorisedFunction(BaseConverter):
@@ -83,43 +331,205 @@ class VectorisedFunction(BaseConverter):
         return self._func(data)
 
 
-class AutoCorrect(BaseConverter):
-    def __init__(self):
+def _correct_text(text: str) -> str:
+    from textblob import TextBlob
+    tb = TextBlob(text)
+    return str(tb.correct())
+
+
+class _TextCache:
+    """ An SQLite cache of text conversions keyed by a hash of the text """
+    _BATCH = 500
+
+    def __init__(self, path, table):
+        self._path = str(path)
+        self._table = table
+        with closing(sqlite3.connect(self._path)) as con, con:
+            con.execute("CREATE TABLE IF NOT EXISTS " + table
+                        + " (key TEXT PRIMARY KEY, value TEXT)")
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list[str]) -> dict:
+        keys = {self._key(t): t for t in texts}
+        key_list = list(keys)
+        found = {}
+        with closing(sqlite3.connect(self._path)) as con:
+            for i in range(0, len(key_list), self._BATCH):
+                batch = key_list[i:i + self._BATCH]
+                query = ("SELECT key, value FROM " + self._table
+                         + " WHERE key IN (" + ",".join("?" * len(batch))
+                         + ")")
+                for key, value in con.execute(query, batch):
+                    found[keys[key]] = value
+        return found
+
+    def set_many(self, pairs) -> None:
+        rows = [(self._key(text), value) for text, value in pairs]
+        with closing(sqlite3.connect(self._path)) as con, con:
+            con.executemany("INSERT OR REPLACE INTO " + self._table
+                            + " VALUES (?, ?)", rows)
+
+
+class AutoCorrect(ElementwiseConverter):
+    """ Correct spelling using TextBlob
+
+    Args:
+        cache_size (int): See ElementwiseConverter.
+        n_jobs (int): The number of worker processes. None or 1 (default)
+            corrects in this process; -1 uses every CPU.
+        chunksize (int): The number of texts sent to a worker at a time.
+        cache_path (str): Optional path to an SQLite file that stores
+            corrections keyed by a hash of the text, so reruns skip texts
+            that were already corrected.
+    """
+    def __init__(self, cache_size=None, n_jobs=None, chunksize=1000,
+                 cache_path=None):
+        super().__init__(cache_size=cache_size)
         if not TEXTBLOB_LOADED:
             raise ModuleNotFoundError("TextBlob package required.")
-
-    def _autocorrect(self, text: str):
-        tb = TextBlob(text)
-        return str(tb.correct())
-
-    def convert(self, data) -> np.ndarray:
-        return np.array([self._autocorrect(val) for val in data])
-
-
-class Lower(BaseConverter):
-    def convert(self, data: np.ndarray) -> np.ndarray:
-        return np.array([s.lower() for s in data])
+        self._n_jobs = n_jobs
+        self._chunksize = chunksize
+        self._disk_cache = None
+        if cache_path is not None:
+            self._disk_cache = _TextCache(cache_path, "autocorrect")
+
+    def _convert_value(self, text: str):
+        return _correct_text(text)
+
+    def _correct_many(self, texts: list) -> list:
+        n_jobs = os.cpu_count() if self._n_jobs == -1 else self._n_jobs
+        if n_jobs is None or n_jobs <= 1 or len(texts) <= self._chunksize:
+            return [_correct_text(t) for t in texts]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(_correct_text, texts,
+                                     chunksize=self._chunksize))
+
+    def _convert_uniques(self, uniques) -> list:
+        results = {}
+        pending = []
+        for text in uniques:
+            found, out = self._cache_get(text)
+            if found:
+                results[text] = out
+            else:
+                pending.append(text)
+        pending = list(dict.fromkeys(pending))
+        missed = pending
+        if self._disk_cache is not None:
+            strings = [t for t in pending if isinstance(t, str)]
+            results.update(self._disk_cache.get_many(strings))
+            pending = [t for t in pending if t not in results]
+        corrected = self._correct_many(pending)
+        if self._disk_cache is not None:
+            self._disk_cache.set_many(zip(pending, corrected))
+        results.update(zip(pending, corrected))
+        for text in missed:
+            self._cache_put(text, results[text])
+        return [results[text] for text in uniques]
+
+
+class Lower(ElementwiseConverter):
+    def _convert_value(self, s: str) -> str:
+        return s.lower()
 
 
 class Splitter(BaseConverter):
-    def __init__(self, splits: list[str]):
+    """ Split text on any of several separators and strip the parts
+
+    Args:
+        splits (list[str]): The separators.
+        bulk (bool): If True, operate on the whole column at once using
+            pandas string methods.
+        ragged (bool): If True, return a Ragged array instead of a list of
+            lists.
+    """
+    def __init__(self, splits: list[str], bulk=False, ragged=False):
         self._splits = splits
+        self._bulk = bulk
+        self._ragged = ragged
+        self._pattern = re.compile(_alternation(splits)) if splits else None
 
     def _split(self, text: str):
-        s = text
-        for split in self._splits:
-            s = s.replace(split, "|||")
-        lst = s.split("|||")
-        stripped = [t.strip() for t in lst]
-        return stripped
+        if self._pattern is None:
+            return [text.strip()]
+        return [part.strip() for part in self._pattern.split(text)]
+
+    def _split_bulk(self, data) -> list[list] | Ragged:
+        if PYARROW_LOADED:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            arr = pa.array(np.asarray(data, dtype=object), type=pa.string())
+            split = pc.split_pattern_regex(arr, self._pattern.pattern)
+            # Strip the parts after splitting, as separators may contain
+            # whitespace at the ends of the text
+            split = pa.ListArray.from_arrays(
+                split.offsets, pc.utf8_trim_whitespace(split.values)
+            )
+            if self._ragged:
+                return Ragged.from_arrow(split)
+            return split.to_pylist()
+        lists = _as_strings(data).str.split(self._pattern, regex=True)
+        lists = [[part.strip() for part in lst] for lst in lists]
+        return Ragged.from_lists(lists) if self._ragged else lists
+
+    def convert(self, data) -> list[list] | Ragged:
+        if self._bulk and self._pattern is not None:
+            return self._split_bulk(data)
+        lists = [self._split(val) for val in data]
+        return Ragged.from_lists(lists) if self._ragged else lists
+
+
+class _Fused(ElementwiseConverter):
+    """ Neighbouring element-wise converters run as one pass """
+
+    def __init__(self, converters, unique=True):
+        super().__init__()
+        self._converters = converters
+        self._unique = unique
+
+    def _convert_uniques(self, values) -> list:
+        # Each stage converts every value at once, so stages that batch or
+        # cache their work, like AutoCorrect, still do
+        for converter in self._converters:
+            values = converter._convert_uniques(values)
+        return values
+
+    def convert(self, data) -> np.ndarray:
+        if not self._unique:
+            return np.array(self._convert_uniques(_scalars(_values(data))))
+        return super().convert(data)
 
-    def convert(self, data) -> list[list]:
-        return [self._split(val) for val in data]
+    def convert_block(self, columns: list) -> list:
+        if not self._unique:
+            return [self.convert(column) for column in columns]
+        return super().convert_block(columns)
+
+    def _str(self, prefix=""):
+        how = "unique values" if self._unique else "elements"
+        names = " -> ".join(c._str() for c in self._converters)
+        return prefix + "fused over " + how + ": " + names
 
 
 class Pipeline(BaseConverter):
-    def __init__(self, *converters: BaseConverter):
+    """ Run converters in sequence
+
+    Neighbouring element-wise converters are fused, so the data is
+    factorised once and only its unique values pass through all of them.
+    Other converters receive the whole array.
+
+    Args:
+        converters (BaseConverter): The converters, in order.
+        unique (bool): If True (default), fused converters run once over the
+            unique values. If False, they run once per element, which can be
+            faster for data that is mostly unique, like free text.
+    """
+    def __init__(self, *converters: BaseConverter, unique=True):
         self._converters = converters
+        self._unique = unique
+        self._plan = self._make_plan()
 
     def __str__(self):
         return self._str()
@@ -128,8 +538,51 @@ class Pipeline(BaseConverter):
         lst = [c._str(prefix) for c in self._converters]
         return prefix + ', '.join(lst)
 
+    @property
+    def blockwise(self):
+        return all(step.blockwise for step in self._plan)
+
+    def convert_block(self, columns: list) -> list:
+        transformed = columns
+        for step in self._plan:
+            transformed = step.convert_block(transformed)
+        return transformed
+
+    def _flattened(self):
+        for converter in self._converters:
+            if isinstance(converter, Pipeline):
+                yield from converter._flattened()
+            else:
+                yield converter
+
+    def _make_plan(self):
+        plan = []
+        run = []
+        for converter in self._flattened():
+            if converter.elementwise:
+                run.append(converter)
+                continue
+            if run:
+                plan.append(self._fuse(run))
+                run = []
+            plan.append(converter)
+        if run:
+            plan.append(self._fuse(run))
+        return plan
+
+    def _fuse(self, run):
+        if len(run) == 1 and self._unique:
+            return run[0]
+        return _Fused(run, unique=self._unique)
+
+    def explain(self) -> str:
+        """ Return a description of the steps the pipeline will run """
+        lines = [str(i + 1) + ". " + step._str()
+                 for i, step in enumerate(self._plan)]
+        return "\n".join(lines)
+
     def convert(self, data: np.ndarray) -> np.ndarray:
         transformed = data
-        for converter in self._converters:
-            transformed = converter.convert(transformed)
+        for step in self._plan:
+            transformed = step.convert(transformed)
         return transformed
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Compact storage for Likert answers and code indicators."""
+
+import numpy as np
+import pandas as pd
+
+from .ragged import Ragged
+
+COMPACT_FLOAT = np.float32
+# Candidate integer types, smallest first, with their nullable names
+INT_TYPES = [
+    (np.uint8, "UInt8"),
+    (np.int8, "Int8"),
+    (np.uint16, "UInt16"),
+    (np.int16, "Int16"),
+    (np.int32, "Int32"),
+]
+
+
+def smallest_int(lo, hi):
+    """ Return the smallest numpy and nullable int types holding lo to hi """
+    for typ, nullable in INT_TYPES:
+        info = np.iinfo(typ)
+        if info.min <= lo and hi <= info.max:
+            return typ, nullable
+    return np.int64, "Int64"
+
+
+def compact(values):
+    """ Return whole-number data as the smallest nullable integer type
+
+    Missing values are kept as pd.NA in the nullable type's mask. Data that
+    is not numeric, or has fractional values, is returned unchanged.
+    """
+    kind = getattr(values, "dtype", np.dtype(object)).kind
+    if kind not in "biuf":
+        return values
+    arr = np.asarray(values, dtype=float)
+    present = arr[~np.isnan(arr)]
+    if present.size == 0 or np.any(present != np.round(present)):
+        return values
+    _, nullable = smallest_int(present.min(), present.max())
+    out = pd.array(arr, dtype=pd.Float64Dtype()).astype(nullable)
+    if isinstance(values, pd.Series):
+        return pd.Series(out, index=values.index, name=values.name)
+    return out
+
+
+def dense(values):
+    """ Return compact nullable integer data as floats, with NaN for missing
+
+    Other data is returned unchanged.
+    """
+    dtype = getattr(values, "dtype", None)
+    if (pd.api.types.is_extension_array_dtype(dtype)
+            and dtype.kind in "iu"):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return values
+
+
+def nbytes(values) -> int:
+    """ Return the approximate memory used by some data """
+    if values is None:
+        return 0
+    if isinstance(values, (pd.Series, pd.Index)):
+        return int(values.memory_usage(deep=True, index=False)
+                    if isinstance(values, pd.Series)
+                    else values.memory_usage(deep=True))
+    if isinstance(values, Ragged):
+        return nbytes(pd.Series(values.values)) + values.offsets.nbytes
+    if isinstance(values, pd.api.extensions.ExtensionArray):
+        return int(values.nbytes)
+    if hasattr(values, "nnz"):  # scipy.sparse
+        return int(values.data.nbytes + values.indices.nbytes
+                   + values.indptr.nbytes)
+    if isinstance(values, np.ndarray):
+        return int(values.nbytes)
+    return nbytes(pd.Series(values, dtype=object))
@@ -9,13 +9,78 @@ import numpy as np
 import pandas as pd
 
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import suppress
 
 
-from .item import BaseItem
+from .item import BaseItem, NumericItem
+from .stats import Moments, count_labels, level_counts, segment_codes
+from . import collect
+from .dtypes import COMPACT_FLOAT, dense, nbytes
+
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+def _run_batch(batch, df, method):
+    """ Run fit, transform or fit_transform on a batch of items
+
+    Items in a batch of more than one share a converter, so their columns
+    are selected together and converted in one convert_block call. Each
+    column is still converted exactly as it would be on its own.
+    """
+    if len(batch) == 1:
+        getattr(batch[0], method)(df)
+        return batch
+    raw_block = df[[item.key for item in batch]]
+    raws = [raw_block.iloc[:, j] for j in range(len(batch))]
+    converter = batch[0]._converter
+    converted = raws if converter is None else converter.convert_block(raws)
+    for item, raw, values in zip(batch, raws, converted):
+        getattr(item, "_" + method)(raw, values)
+    return batch
+
+
+def _sync(original, fitted):
+    """ Copy the fitted state of an item or group returned by a worker
+
+    The original objects are kept, so references to them stay valid, and so
+    are their converters, which may be shared with other items.
+    """
+    if isinstance(original, BaseGroup):
+        for name, child in original._items.items():
+            _sync(child, fitted._items[name])
+        skip = ["_items", "_all_items", "_converter"]
+    else:
+        skip = ["_converter"]
+    state = {k: v for k, v in fitted.__dict__.items() if k not in skip}
+    original.__dict__.update(state)
+    if isinstance(original, BaseGroup):
+        original._synced()
 
 
 class BaseGroup:
+    """ A group of items and sub-groups
+
+    Args:
+        name (str): The group name.
+        pref (str): A prefix added to the keys of items added with
+            add_item.
+        text (str): Descriptive text.
+        items (list): Items or groups to add.
+        item_cls: The default class for add_item.
+        group_cls: The default class for add_group.
+        converter (BaseConverter): The default converter for add_item.
+        executor (str): Set to 'thread' or 'process' to fit and transform
+            items and sub-groups concurrently. Threads suit NumPy-heavy
+            converters; processes suit pure-Python converters like
+            AutoCorrect, but need picklable items and converters. None
+            (default) runs them in sequence.
+        n_jobs (int): The maximum number of workers for the executor.
+    """
+
+    _view_dtype = None
+
     def __init__(
         self,
         name,
@@ -25,7 +90,14 @@ class BaseGroup:
         item_cls=None,
         group_cls=None,
         converter=None,
+        executor=None,
+        n_jobs=None,
     ):
+        if executor is not None and executor not in EXECUTORS:
+            raise ValueError("executor must be one of: "
+                             + ", ".join(EXECUTORS))
+        self._executor = executor
+        self._n_jobs = n_jobs
         self._name = name
         self._pref = pref
         self._text = text
@@ -34,6 +106,7 @@ class BaseGroup:
         self._group_cls = group_cls
         self._converter = converter
         self._all_items = {}
+        self._views = {}
         if items is not None:
             self.add(items)
 
@@ -74,6 +147,23 @@ class BaseGroup:
     def size(self):
         return self.items[0].size
 
+    @property
+    def state(self):
+        """ A token that changes whenever any item's data or fit changes """
+        return tuple(item.state for item in self.items)
+
+    def _view(self, name, func):
+        """ Return a derived view, recomputing it only if items changed """
+        state = self.state
+        cached = self._views.get(name)
+        if cached is None or cached[0] != state:
+            out = func()
+            if self._view_dtype not in (None, out.dtype):
+                out = out.astype(self._view_dtype)
+            cached = (state, out)
+            self._views[name] = cached
+        return cached[1]
+
     def add_item(
         self, name, key, converter=None, cls=None, text=None, **kwargs
     ):
@@ -118,6 +208,18 @@ class BaseGroup:
         out.update(self._all_items)
         return out
 
+    def columns(self) -> list[str]:
+        """ Return the source columns read by every item in the tree """
+        out = {}
+        for item in self.items:
+            out.update(dict.fromkeys(item.columns()))
+        return list(out)
+
+    def partial_fit(self, df: pd.DataFrame) -> None:
+        """ Update each item's fitted statistics with a chunk of data """
+        for item in self.items:
+            item.partial_fit(df)
+
     def _add(self, item: BaseItem):
         if item.name in self._items or item.name in self._all_items:
             raise KeyError("Duplicate item name specified: " + item.name)
@@ -163,57 +265,123 @@ class BaseGroup:
         return np.array(val_list).T
 
     def _as_df(self, val_list):
-        names = self.names
-        data = np.array(val_list).T
-        df = pd.DataFrame(data, columns=names)
-        df.index.name = "response"
-        df.columns.name = "item"
+        return collect.to_frame(self._as_dict(val_list), keep_index=False)
+
+    def _batches(self):
+        """ Split the items into batches that share a converter
+
+        Returns a list of batches. Each is a list of items that can be
+        fetched with one column selection and converted in one call. Groups
+        and items that cannot be batched are in batches of their own.
+        """
+        batches = []
+        shared = {}
+        for item in self.items:
+            if isinstance(item, BaseItem) and item.batchable:
+                key = id(item._converter)
+                if key not in shared:
+                    shared[key] = []
+                    batches.append(shared[key])
+                shared[key].append(item)
+            else:
+                batches.append([item])
+        return batches
+
+    def _run(self, df: pd.DataFrame, method: str) -> None:
+        batches = self._batches()
+        if self._executor is None or len(batches) < 2:
+            for batch in batches:
+                _run_batch(batch, df, method)
+            return
+        with EXECUTORS[self._executor](max_workers=self._n_jobs) as pool:
+            if self._executor == "thread":
+                futures = [pool.submit(_run_batch, batch, df, method)
+                           for batch in batches]
+                for future in futures:
+                    future.result()
+                return
+            futures = [pool.submit(_run_batch, batch, self._subset(df, batch),
+                                   method)
+                       for batch in batches]
+            for batch, future in zip(batches, futures):
+                for original, fitted in zip(batch, future.result()):
+                    _sync(original, fitted)
+
+    @staticmethod
+    def _subset(df, batch):
+        """ Return only the columns a batch needs, to send to a worker """
+        if all(isinstance(item, BaseItem) for item in batch):
+            return df[[item.key for item in batch]]
         return df
 
-    def fit(self, df: pd.DataFrame) -> np.ndarray:
+    def _synced(self):
+        """ Called after fitted state is copied back from a worker """
+        pass
+
+    def memory_usage(self) -> pd.DataFrame:
+        """ Return the bytes used by every item in the tree
+
+        Returns:
+            pd.DataFrame: A row for each item and group, with a column for
+            each kind of data and a total.
+        """
+        rows = {}
+        self._memory_rows(rows)
+        df = pd.DataFrame.from_dict(rows, orient="index").fillna(0)
+        order = ["raw", "converted", "fitted", "views", "coded"]
+        df = df[[c for c in order if c in df.columns]].astype(np.int64)
+        df["total"] = df.sum(axis=1)
+        df.index.name = "item"
+        return df
+
+    def _memory_rows(self, rows):
+        views = [cached[1] for cached in self._views.values()]
+        rows[self.name] = {"views": sum(nbytes(v) for v in views)}
         for item in self.items:
-            item.fit(df)
+            if isinstance(item, BaseGroup):
+                item._memory_rows(rows)
+            else:
+                rows[item.name] = item.memory_usage()
+
+    def fit(self, df: pd.DataFrame) -> np.ndarray:
+        self._run(df, "fit")
 
     def transform(self, df: pd.DataFrame) -> np.ndarray:
-        for item in self.items:
-            item.transform(df)
+        self._run(df, "transform")
 
     def fit_transform(self, df: pd.DataFrame) -> np.ndarray:
-        for item in self.items:
-            item.fit_transform(df)
+        self._run(df, "fit_transform")
 
     def values(self, typ='default'):
         raise ValueError(
             "Item " + self.name + " — typ not understood:" + str(typ)
         )
 
+    def _collect(self, typ, match_size, out: dict) -> None:
+        """ Add references to the data of every item in the tree to out """
+        for item in self.items:
+            item._collect(typ, match_size, out)
+        # Now append it's own scale / summary
+        with suppress(ValueError):
+            values = self.values(typ)
+            if not match_size or len(values) == self.size:
+                out[self.name] = values
+
     def data_dict(
         self,
         typ: str = "default",
         match_size: bool = True,
     ) -> dict:
-        dcts = [
-            item.data_dict(typ=typ, match_size=match_size)
-            for item in self.items
-        ]
-        # Now append it's own scale / summary
-        with suppress(ValueError):
-            values = self.values(typ)
-            if match_size and len(values) != self.size:
-                pass
-            else:
-                dcts.append({self.name: values})
         out = {}
-        for dct in dcts:
-            out.update(dct)
+        self._collect(typ, match_size, out)
         return out
 
     def data_df(self, typ="default", match_size=True):
-        dct = self.data_dict(typ=typ, match_size=match_size)
-        df = pd.DataFrame.from_dict(dct)
-        df.index.name = "response"
-        df.columns.name = "item"
-        return df
+        return collect.to_frame(self.data_dict(typ, match_size))
+
+    def data_table(self, typ="default", match_size=True):
+        """ Return the data as a pyarrow Table """
+        return collect.to_table(self.data_dict(typ, match_size))
 
 
 class Group(BaseGroup):
@@ -221,40 +389,295 @@ class Group(BaseGroup):
 
 
 class NumericGroup(BaseGroup):
+    def __init__(self, *args, view_dtype=None, matrix=False, compact=False,
+                 **kwargs):
+        """ As BaseGroup, with extra options:
+
+        Args:
+            view_dtype: The dtype of the cached derived views (e.g.
+                np.float32 to halve their memory).
+            matrix (bool): If True, the group stores its converted data in
+                one contiguous respondents × items block and each item's
+                converted data is a column view into it.
+            compact (bool): If True, NumericItems added with add_item are
+                compact (see NumericItem), and derived views are float32
+                unless view_dtype is given.
+        """
+        super().__init__(*args, **kwargs)
+        if compact and view_dtype is None:
+            view_dtype = COMPACT_FLOAT
+        self._view_dtype = view_dtype
+        self._matrix = matrix
+        self._compact = compact
+
+    def add_item(self, name, key, converter=None, cls=None, text=None,
+                 **kwargs):
+        item_cls = self._item_cls if cls is None else cls
+        if self._compact and isinstance(item_cls, type) and \
+                issubclass(item_cls, NumericItem):
+            kwargs.setdefault("compact", True)
+        return super().add_item(name, key, converter=converter, cls=cls,
+                                text=text, **kwargs)
+
+    def _as_array(self, val_list):
+        # Compact nullable columns would otherwise stack as objects
+        return super()._as_array([dense(v) for v in val_list])
+
     def _means(self, values):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             return np.nanmean(values, axis=0)
 
+    def _stack_converted(self):
+        items = self.items
+        for item in items:
+            if not isinstance(item, NumericItem):
+                raise ValueError("Matrix storage requires every item in "
+                                 + self.name + " to be a NumericItem.")
+        dtype = float if self._view_dtype is None else self._view_dtype
+        # Fortran order keeps each item's column contiguous
+        block = np.empty((self.size, len(items)), dtype=dtype, order="F")
+        for j, item in enumerate(items):
+            block[:, j] = np.asarray(item.converted, dtype=dtype)
+        return block
+
+    def _bind_block(self):
+        block = self._stack_converted()
+        for j, item in enumerate(self.items):
+            item._converted = block[:, j]
+        self._views["block"] = (self.state, block)
+
+    @property
+    def block(self):
+        """ The converted data as one respondents × items array """
+        return self._view("block", self._stack_converted)
+
+    def _run(self, df: pd.DataFrame, method: str) -> None:
+        super()._run(df, method)
+        if self._matrix and method != "fit":
+            self._bind_block()
+
+    def _synced(self):
+        # Column views are copied when pickled, so bind them again
+        if not self._matrix or self.items[0].converted is None:
+            return
+        cached = self._views.get("block")
+        if cached is None or cached[0] != self.state:
+            self._bind_block()
+            return
+        for j, item in enumerate(self.items):
+            item._converted = cached[1][:, j]
+
+    def converted_data(self, typ="df"):
+        if not self._matrix or typ == "dict":
+            return super().converted_data(typ)
+        block = self.block
+        if typ == "array":
+            return block
+        df = pd.DataFrame(block, columns=self.names, copy=False)
+        df.index.name = "response"
+        df.columns.name = "item"
+        return df
+
+    def _standardised_block(self):
+        block = self.block
+        return (block - self.item_means()) / self.item_stds()
+
+    def _normalised_block(self):
+        out = self.block - np.array([item.min for item in self.items])
+        return out / np.nanmax(out, axis=0)
+
     @property
     def raw(self):
-        return self._means(self.raw_data("array"))
+        return self._view(
+            "raw", lambda: self._means(self.raw_data("array"))
+        )
 
     @property
     def converted(self):
-        return self._means(self.converted_data("array"))
+        return self._view(
+            "converted", lambda: self._means(self.converted_data("array"))
+        )
+
+    def _standardised(self):
+        if self._matrix:
+            return self._means(self._standardised_block().T)
+        return self._means([item.standardised for item in self.items])
+
+    def _normalised(self):
+        if self._matrix:
+            return self._means(self._normalised_block().T)
+        return self._means([item.normalised for item in self.items])
 
     @property
     def standardised(self):
-        return self._means([item.standardised for item in self.items])
+        return self._view("standardised", self._standardised)
 
     @property
     def normalised(self):
-        return self._means([item.normalised for item in self.items])
+        return self._view("normalised", self._normalised)
 
     def means(self, typ: str = None) -> np.ndarray:
         values = self.converted_data("array")
         return np.nanmean(values, axis=1)
 
-    def item_counts(self, as_int=True, as_percent=False):
+    def item_counts(self, as_int=True, as_percent=False, typ="list"):
+        """ Return how often each response level occurs for every item
+
+        All items are counted with a single bincount over the converted
+        data, with missing values counted under 'na'.
+
+        Args:
+            as_int (bool): Label whole-number levels as ints.
+            as_percent (bool): Return percentages of respondents.
+            typ (str): 'list' for a dict per item of the levels it has, or
+                'df' for an items × levels table.
+        """
+        levels, counts = level_counts(self.converted_data("array"))
+        n = self.size / 100 if as_percent else 1
+        keys = count_labels(levels, as_int)
+        if typ == "df":
+            return self._count_df(counts / n, keys, self.names)
         lst = []
-        for item in self.items:
-            dct = {"item": item.name}
-            counts = item.counts(as_int, as_percent)
-            dct.update(counts)
+        for name, row in zip(self.names, counts):
+            dct = {"item": name}
+            dct.update({k: c / n for k, c in zip(keys, row) if c})
             lst.append(dct)
         return lst
 
+    @staticmethod
+    def _count_df(counts, keys, index):
+        df = pd.DataFrame(counts, index=index, columns=keys)
+        if not df["na"].any():
+            df = df.drop(columns="na")
+        df.columns.name = "level"
+        return df
+
+    def frequencies(self) -> pd.DataFrame:
+        """ Return counts and percents of each response level for every item
+
+        Returns:
+            pd.DataFrame: Items as rows, with ('n', level) and
+            ('percent', level) columns.
+        """
+        levels, counts = level_counts(self.converted_data("array"))
+        keys = count_labels(levels)
+        n = self._count_df(counts, keys, self.names)
+        pct = n * (100 / self.size)
+        return pd.concat({"n": n, "percent": pct}, axis=1,
+                         names=["stat", "level"])
+
+    def item_counts_by(self, df: pd.DataFrame, by, as_int=True,
+                       as_percent=False) -> pd.DataFrame:
+        """ Return how often each response level occurs for every item and
+        segment
+
+        Args:
+            df (pd.DataFrame): The data.
+            by (str | array-like): A column name in df, or the segment of
+                each row.
+            as_int (bool): Label whole-number levels as ints.
+            as_percent (bool): Return percentages of each segment's
+                respondents.
+
+        Returns:
+            pd.DataFrame: Rows indexed by (segment, item), with levels as
+            columns.
+        """
+        codes, labels, name = segment_codes(df, by)
+        levels, counts = level_counts(self.block_from(df), codes,
+                                      len(labels))
+        if as_percent:
+            sizes = np.bincount(codes[codes >= 0], minlength=len(labels))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                counts = counts * (100 / sizes[:, None, None])
+        index = pd.MultiIndex.from_product([labels, self.names],
+                                           names=[name, "item"])
+        width = counts.shape[-1]
+        return self._count_df(counts.reshape(-1, width),
+                              count_labels(levels, as_int), index)
+
+    def moments(self) -> Moments:
+        """ Return the fitted Moments of every item as one """
+        return Moments.stack([item.moments for item in self.items])
+
+    def fitted_block(self) -> np.ndarray:
+        """ Return the fitted data as one respondents × items array """
+        return np.column_stack([item.fitted_values() for item in self.items])
+
+    def stats(self, typ="df", percentiles=None):
+        """ Return summary statistics for every item
+
+        The statistics come from the items' fitted Moments, so no data is
+        read unless percentiles are asked for, which are then computed for
+        every item in one call.
+
+        Args:
+            typ (str): 'df', 'array' or 'dict'.
+            percentiles (list[float]): Optional percentiles (0 to 100) to
+                add, labelled like 'p50'.
+        """
+        if not all(isinstance(item, NumericItem) for item in self.items):
+            return super().stats(typ)
+        labels, values = self.moments().table()
+        table = np.vstack(values).astype(float)
+        if percentiles:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                pct = np.nanpercentile(self.fitted_block(), percentiles,
+                                       axis=0)
+            labels = labels + ["p" + format(p, "g") for p in percentiles]
+            table = np.vstack([table, pct])
+        if typ == "array":
+            return table
+        elif typ == "dict":
+            return {name: table[:, j] for j, name in enumerate(self.names)}
+        df = pd.DataFrame(table, index=labels, columns=self.names)
+        df.columns.name = "item"
+        return df
+
+    def block_from(self, df: pd.DataFrame) -> np.ndarray:
+        """ Return converted values from df as a respondents × items array
+        without storing them """
+        return np.column_stack([item.values_from(df) for item in self.items])
+
+    def stats_by(self, df: pd.DataFrame, by) -> pd.DataFrame:
+        """ Return summary statistics for every item and segment
+
+        The segment keys are factorised once and every segment's
+        statistics come from one sorted reduction over the converted data.
+
+        Args:
+            df (pd.DataFrame): The data.
+            by (str | array-like): A column name in df, or the segment of
+                each row.
+
+        Returns:
+            pd.DataFrame: Rows indexed by (segment, statistic), with items
+            as columns.
+        """
+        codes, labels, name = segment_codes(df, by)
+        moments = Moments.from_groups(self.block_from(df), codes,
+                                      len(labels))
+        stat_labels, values = moments.table()
+        # values[i] is segments × items; interleave to segment-major rows
+        table = np.stack(values, axis=1).reshape(-1, len(self.items))
+        index = pd.MultiIndex.from_product([labels, stat_labels],
+                                           names=[name, "stat"])
+        df_out = pd.DataFrame(table.astype(float), index=index,
+                              columns=self.names)
+        df_out.columns.name = "item"
+        return df_out
+
+    def means_by(self, df: pd.DataFrame, by) -> pd.Series:
+        """ Return the average of the respondent means for each segment """
+        codes, labels, _ = segment_codes(df, by)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            means = np.nanmean(self.block_from(df), axis=1)
+        moments = Moments.from_groups(means, codes, len(labels))
+        return pd.Series(moments.mean, index=labels, name="mean")
+
     def item_means(self):
         return np.array([item.mean for item in self.items])
 
@@ -10,11 +10,19 @@ import numpy as np
 import pandas as pd
 
 from .convert import BaseConverter
+from .ragged import Ragged
+from .coding import Indicators
+from .stats import Moments, count_labels, level_counts, segment_codes
+from . import collect
+from .dtypes import COMPACT_FLOAT, compact, nbytes
+from .tally import TopK, count_values, flatten
 
 
 class BaseItem:
     """A base item class"""
 
+    _view_dtype = None
+
     def __init__(
         self,
         name: str,
@@ -24,9 +32,14 @@ class BaseItem:
     ):
         self._name = name
         self._key = key
+        self._version = 0
+        self._views = {}
         self.set_converter(converter)
         self._text = text
         self._raw = None
+        self._converted = None
+        self._raw_fitted = None
+        self._converted_fitted = None
 
     def __str__(self):
         return self.__class__.__name__ + " '" + self.name + "'"
@@ -74,6 +87,26 @@ class BaseItem:
 
     def set_converter(self, converter):
         self._converter = converter
+        self._invalidate()
+
+    @property
+    def state(self):
+        """ A token that changes whenever the item's data or fit changes """
+        return self._version
+
+    def _invalidate(self):
+        self._version += 1
+        self._views = {}
+
+    def _view(self, name, func):
+        """ Return a derived view, computing and caching it if needed """
+        views = self._views
+        if name not in views:
+            out = func()
+            if self._view_dtype not in (None, out.dtype):
+                out = out.astype(self._view_dtype)
+            views[name] = out
+        return views[name]
 
     def _convert(self, series: np.ndarray) -> np.ndarray:
         if self._converter is None:
@@ -85,24 +118,41 @@ class BaseItem:
     def get_raw(self, df: pd.DataFrame) -> np.ndarray:
         return df[self._key]
 
+    @property
+    def batchable(self):
+        """ True if a group may fetch and convert this item with others """
+        converter = self._converter
+        return type(self).get_raw is BaseItem.get_raw and (
+            converter is None or converter.blockwise
+        )
+
     def fit(self, df: pd.DataFrame) -> None:
         raw = self.get_raw(df)
-        converted = self._convert(raw)
+        self._fit(raw, self._convert(raw))
+
+    def transform(self, df: pd.DataFrame) -> None:
+        raw = self.get_raw(df)
+        return self._transform(raw, self._convert(raw))
+
+    def fit_transform(self, df: pd.DataFrame) -> None:
+        raw = self.get_raw(df)
+        return self._fit_transform(raw, self._convert(raw))
+
+    def _fit(self, raw, converted) -> None:
+        self._invalidate()
         self._raw_fitted = raw
         self._converted_fitted = converted
         self._post_fit(converted)
 
-    def transform(self, df: pd.DataFrame) -> None:
-        raw = self.get_raw(df)
-        converted = self._convert(raw)
+    def _transform(self, raw, converted):
+        self._invalidate()
         self._raw = raw
         self._converted = converted
         self._post_transform(converted)
         return self._converted
 
-    def fit_transform(self, df: pd.DataFrame) -> None:
-        raw = self.get_raw(df)
-        converted = self._convert(raw)
+    def _fit_transform(self, raw, converted):
+        self._invalidate()
         self._raw_fitted = raw
         self._converted_fitted = converted
         self._post_fit(converted)
@@ -128,40 +178,74 @@ class BaseItem:
                 "Item " + self.name + " — typ not understood:" + str(typ)
             )
 
-    def data_dict(self, typ="default", match_size=True):
+    def _collect(self, typ, match_size, out: dict) -> None:
+        """ Add references to this item's data to out, without copying """
         values = self.values(typ)
         if match_size and len(values) != self.size:
-            return {}
-        return {self.name: values}
+            return
+        out[self.name] = values
+
+    def data_dict(self, typ="default", match_size=True):
+        out = {}
+        self._collect(typ, match_size, out)
+        return out
 
     def data_df(self, typ="default", match_size=True):
-        dct = self.data_dict(typ=typ, match_size=match_size)
-        df = pd.DataFrame.from_dict(dct)
-        df.index.name = "response"
-        df.columns.name = "item"
-        return df
+        return collect.to_frame(self.data_dict(typ, match_size))
+
+    def data_table(self, typ="default", match_size=True):
+        """ Return the data as a pyarrow Table """
+        return collect.to_table(self.data_dict(typ, match_size))
 
     def _get_all_items(self):
         return {self.name: self}
 
+    def columns(self) -> list[str]:
+        """ Return the source columns this item reads """
+        return [self._key]
+
+    def memory_usage(self) -> dict:
+        """ Return the bytes used by each kind of data the item holds """
+        fitted = [v for v in (self._raw_fitted, self._converted_fitted)
+                  if v is not self._raw and v is not self._converted]
+        converted = self._converted
+        return {
+            "raw": nbytes(self._raw),
+            "converted": 0 if converted is self._raw else nbytes(converted),
+            "fitted": sum(nbytes(v) for v in fitted),
+            "views": sum(nbytes(v) for v in self._views.values()),
+        }
+
+    def partial_fit(self, df: pd.DataFrame) -> None:
+        """ Update fitted statistics with a chunk of data
+
+        Items without fitted statistics have nothing to update.
+        """
+        pass
+
 
 class Item(BaseItem):
     pass
 
 
 class MultiCodedItem(BaseItem):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, compact=False, **kwargs):
+        """ As BaseItem. If compact, coded columns use the smallest integer
+        dtype that holds the present and fill values """
         super().__init__(*args, **kwargs)
+        self._compact = compact
+        self._indicators = None
         self._df_wide = None
 
     def linearised(self, data=None):
+        """ Return the flattened values and the response index of each """
         data = self.converted if data is None else data
-        if not isinstance(data, list):
-            raise ValueError("Data is not a list: " + str(type(data)))
-        mapping = [[i] * len(lst) for i, lst in enumerate(data)]
-        lin_data = [value for lst in data for value in lst]
-        lin_mapping = [value for lst in mapping for value in lst]
-        return lin_data, lin_mapping
+        if isinstance(data, list):
+            data = Ragged.from_lists(data)
+        elif not isinstance(data, Ragged):
+            raise ValueError("Data is not a list or Ragged: "
+                             + str(type(data)))
+        return data.values, data.row_ids()
 
     def linearised_df(self, data=None):
         lin_data, lin_mapping = self.linearised(data)
@@ -177,6 +261,20 @@ class MultiCodedItem(BaseItem):
         df = self.linearised_df()
         df.to_csv(fname)
 
+    @property
+    def indicators(self):
+        return self._indicators
+
+    @property
+    def df_wide(self):
+        """ The wide coded table, built on first access """
+        if self._df_wide is None and self._indicators is not None:
+            self._df_wide = self._indicators.to_df(
+                prefix=self.name + "_", **self._coded_values
+            )
+            self._df_wide.columns.name = self._coded_column
+        return self._df_wide
+
     def set_coded(
         self,
         df: pd.DataFrame,
@@ -184,30 +282,45 @@ class MultiCodedItem(BaseItem):
         present_value=1,
         fill_value=0,
         exclude=None,
+        sparse=False,
     ):
+        """ Set the codes for each linearised phrase
+
+        Args:
+            df (pd.DataFrame): The linearised data with an 'index' column and
+                a column of codes.
+            column_name (str): The name of the column of codes.
+            present_value: The wide table value where a code is present.
+            fill_value: The wide table value where a code is absent.
+            exclude (list): Codes to leave out.
+            sparse (bool): If True, store the codes in a scipy.sparse matrix
+                and emit the wide columns as sparse pandas columns.
+        """
         lin_data, lin_mapping = self.linearised()
         if len(lin_mapping) != len(df["index"]):
             raise ValueError("Coding DataFrame is the wrong length for item "
                              + self.name + ".")
         self._df_coded = df
-        df2 = df.copy()
-        df2["values"] = present_value
-        df_wide = pd.pivot_table(
-            df2,
-            columns=column_name,
-            index="index",
-            values="values",
-            fill_value=fill_value,
+        self._indicators = Indicators(
+            df["index"], df[column_name], exclude=exclude, sparse=sparse
         )
-        if exclude:
-            for excl_name in exclude:
-                df_wide = df_wide.drop(excl_name)
-        df_wide["count"] = np.sum(df_wide, axis=1)
-        df_wide = df_wide.add_prefix(self.name + "_")
-        self._df_wide = df_wide
+        self._coded_column = column_name
+        self._coded_values = {
+            "present_value": present_value,
+            "fill_value": fill_value,
+            "compact": self._compact,
+        }
+        self._df_wide = None
 
     def set_coded_from_csv(
-        self, folder, column_name, present_value=1, fill_value=0, filename=None
+        self,
+        folder,
+        column_name,
+        present_value=1,
+        fill_value=0,
+        filename=None,
+        exclude=None,
+        sparse=False,
     ):
         root = Path(folder)
         if filename is None:
@@ -219,14 +332,22 @@ class MultiCodedItem(BaseItem):
             column_name=column_name,
             present_value=present_value,
             fill_value=fill_value,
+            exclude=exclude,
+            sparse=sparse,
         )
 
-    def data_dict(self, typ="default", match_size=True):
-        dct = super().data_dict(typ=typ, match_size=match_size)
-        if self._df_wide is not None:
-            dct2 = self._df_wide.to_dict("list")
-            dct.update(dct2)
-        return dct
+    def memory_usage(self) -> dict:
+        out = super().memory_usage()
+        if self._indicators is not None:
+            out["coded"] = nbytes(self._indicators.matrix)
+        return out
+
+    def _collect(self, typ, match_size, out: dict) -> None:
+        super()._collect(typ, match_size, out)
+        if self._indicators is not None:
+            out.update(self._indicators.iter_columns(
+                prefix=self.name + "_", **self._coded_values
+            ))
 
 
 class NumericItem(BaseItem):
@@ -239,9 +360,25 @@ class NumericItem(BaseItem):
         converter: BaseConverter = None,
         text=None,
         reverse_offset: float = None,
+        view_dtype=None,
+        compact=False,
     ):
+        """
+        Args:
+            reverse_offset (float): If given, statistics describe
+                reverse_offset minus the data.
+            view_dtype: The dtype of the cached derived views.
+            compact (bool): If True, store whole-number raw and converted
+                data in the smallest nullable integer dtype, and derived
+                views as float32 unless view_dtype is given.
+        """
         super().__init__(name=name, key=key, converter=converter, text=text)
         self._reverse_offset = reverse_offset
+        if compact and view_dtype is None:
+            view_dtype = COMPACT_FLOAT
+        self._view_dtype = view_dtype
+        self._compact = compact
+        self._moments = None
 
     @property
     def mean(self):
@@ -269,48 +406,109 @@ class NumericItem(BaseItem):
 
     @property
     def standardised(self) -> np.ndarray:
-        return (self._converted - self._mean) / self._std
+        return self._view("standardised", self._standardise)
 
     @property
     def normalised(self) -> np.ndarray:
+        return self._view("normalised", self._normalise)
+
+    def _standardise(self):
+        return (self._converted - self._mean) / self._std
+
+    def _normalise(self):
         out = self._converted - self._min
-        return out / np.max(out)
+        return out / np.nanmax(out)
 
     def stats(self):
-        labels = ["mean", "std", "min", "max", "sem", "ci95"]
-        values = [
-            self.mean,
-            self.std,
-            self.min,
-            self.max,
-            self.sem,
-            self.sem * 1.95996,
-        ]
-        return labels, values
+        return self._moments.table()
+
+    def values_from(self, df: pd.DataFrame) -> np.ndarray:
+        """ Return converted values from df without storing them """
+        converted = np.asarray(self._convert(self.get_raw(df)), dtype=float)
+        if self._reverse_offset is not None:
+            converted = -converted + self._reverse_offset
+        return converted
+
+    def stats_by(self, df: pd.DataFrame, by) -> pd.DataFrame:
+        """ Return summary statistics for each segment of df
+
+        Args:
+            df (pd.DataFrame): The data.
+            by (str | array-like): A column name in df, or the segment of
+                each row.
+
+        Returns:
+            pd.DataFrame: Segments as rows and statistics as columns.
+        """
+        codes, labels, _ = segment_codes(df, by)
+        moments = Moments.from_groups(self.values_from(df), codes,
+                                      len(labels))
+        stat_labels, values = moments.table()
+        return pd.DataFrame(np.column_stack(values), index=labels,
+                            columns=stat_labels)
+
+    def fitted_values(self) -> np.ndarray:
+        """ Return the fitted data the statistics describe """
+        if self._converted_fitted is None:
+            raise ValueError("Item " + self.name + " has no fitted data.")
+        fitted = np.asarray(self._converted_fitted, dtype=float)
+        if self._reverse_offset is not None:
+            fitted = -fitted + self._reverse_offset
+        return fitted
 
     def counts(self, as_int=True, as_percent=False):
-        vals, counts = np.unique(self._converted, return_counts=True)
+        levels, counts = level_counts(self._converted)
         n = self.size / 100 if as_percent else 1
+        keys = count_labels(levels, as_int)
+        return {k: c / n for k, c in zip(keys, counts[0]) if c}
 
-        def convert_nan(v):
-            if np.isnan(v):
-                return "na"
-            if as_int:
-                return int(v)
-            return v
-
-        return {convert_nan(v): c / n for v, c in zip(vals, counts)}
+    @property
+    def moments(self):
+        return self._moments
+
+    def _compacted(self, raw, converted):
+        if not self._compact:
+            return raw, converted
+        if converted is raw:
+            raw = converted = compact(raw)
+            return raw, converted
+        return compact(raw), compact(converted)
+
+    def _fit(self, raw, converted) -> None:
+        super()._fit(*self._compacted(raw, converted))
+
+    def _transform(self, raw, converted):
+        return super()._transform(*self._compacted(raw, converted))
+
+    def _fit_transform(self, raw, converted):
+        return super()._fit_transform(*self._compacted(raw, converted))
+
+    def _set_moments(self, moments):
+        self._moments = moments
+        self._mean = moments.mean
+        self._std = moments.std()
+        self._max = moments.max
+        self._min = moments.min
+        self._sem = moments.sem
 
     def _post_fit(self, converted):
         if self._reverse_offset is not None:
             converted = -converted + self._reverse_offset
-        self._mean = np.nanmean(converted)
-        self._std = np.nanstd(converted)
-        self._max = np.nanmax(converted)
-        self._min = np.nanmin(converted)
-        self._sem = np.nanstd(converted, ddof=1) / np.sqrt(np.size(converted))
+        self._set_moments(Moments.from_array(converted))
         return converted
 
+    def partial_fit(self, df: pd.DataFrame) -> None:
+        """ Update the fitted statistics with a chunk of data
+
+        Statistics from each chunk are merged with those already fitted, so
+        data that is too big to load at once can be fitted chunk by chunk.
+        """
+        moments = Moments.from_array(self.values_from(df))
+        self._invalidate()
+        if self._moments is not None:
+            moments = self._moments.merge(moments)
+        self._set_moments(moments)
+
     def _post_transform(self, transformed):
         if self._reverse_offset is not None:
             transformed = -transformed + self._reverse_offset
@@ -326,7 +524,19 @@ class NumericItem(BaseItem):
 
 
 class PhraseCount(BaseItem):
-    """A numeric item class"""
+    """ Counts how often each phrase occurs
+
+    Counts are kept as a Counter, or as a TopK sketch when top_k is given.
+    counts describes the last transformed data. fitted_counts accumulates
+    the data seen by fit, partial_fit and merge, so chunks or survey waves
+    can be counted together, for example with stream.fit.
+
+    Args:
+        seq (list[str]): Optional phrases to list first, in this order,
+            even if they do not occur.
+        top_k (int): Optionally monitor only about this many of the most
+            frequent phrases, using bounded memory.
+    """
 
     def __init__(
         self,
@@ -335,42 +545,81 @@ class PhraseCount(BaseItem):
         converter: BaseConverter = None,
         text=None,
         seq: list[str] = None,
+        top_k: int = None,
     ):
         super().__init__(name=name, key=key, converter=converter, text=text)
         self._seq = seq
+        self._top_k = top_k
+        self._fitted_tally = None
+        self._tally = None
+
+    @property
+    def tally(self):
+        """ The Counter or TopK of the last transformed data """
+        return self._tally
+
+    @property
+    def fitted_tally(self):
+        """ The Counter or TopK accumulated by fit, partial_fit and merge """
+        return self._fitted_tally
 
     @property
     def counts(self):
-        return self._counts
+        return self._as_counts(self._tally)
 
-    def _count(self, converted):
-        if self._seq is not None:
-            counts = {k: 0 for k in self._seq}
+    @property
+    def fitted_counts(self):
+        return self._as_counts(self._fitted_tally)
+
+    def _as_counts(self, tally):
+        if tally is None:
+            return None
+        if self._top_k is None:
+            counts = tally
+            keys = sorted(counts, key=str)
         else:
-            counts = {}
-        all_phrases = []
-        for obj in converted:
-            if isinstance(obj, list):
-                all_phrases.extend(obj)
-            else:
-                all_phrases.append(obj)
-        for phrase in all_phrases:
-            if phrase in counts:
-                counts[phrase] += 1
-            else:
-                counts[phrase] = 0
+            counts = tally.counts()
+            keys = list(counts)
         if self._seq is None:
-            sorted_keys = list(counts.keys())
-            sorted_keys.sort(key=lambda x: str(x))
-            counts = {k: counts[k] for k in sorted_keys}
-        return counts
+            return {k: counts[k] for k in keys}
+        out = {k: counts.get(k, 0) for k in self._seq}
+        out.update({k: counts[k] for k in keys if k not in out})
+        return out
+
+    def _count(self, converted):
+        values = flatten(converted)
+        if self._top_k is None:
+            return count_values(values)
+        return TopK.from_values(values, self._top_k)
+
+    def _post_fit(self, converted):
+        self._fitted_tally = self._count(converted)
 
     def _post_transform(self, transformed):
-        self._counts = self._count(transformed)
+        self._tally = self._count(transformed)
         return transformed
 
+    def partial_fit(self, df: pd.DataFrame) -> None:
+        """ Add the phrases in a chunk of data to the fitted counts """
+        tally = self._count(self._convert(self.get_raw(df)))
+        self.merge(tally)
+
+    def merge(self, tally) -> None:
+        """ Add counts from another chunk or wave to the fitted counts
+
+        Args:
+            tally (Counter | TopK | PhraseCount): The counts to add.
+        """
+        if isinstance(tally, PhraseCount):
+            other = tally
+            tally = other.fitted_tally
+            tally = other.tally if tally is None else tally
+        self._invalidate()
+        fitted = self._fitted_tally
+        self._fitted_tally = tally if fitted is None else fitted + tally
+
     def as_list(self):
-        return list(self._counts.keys())
+        return list(self.counts)
 
     def values(self, typ="default"):
         if typ in ["default", "counts"]:
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Loaders that read only the source columns an item tree needs."""
+
+from pathlib import Path
+
+import pandas as pd
+
+
+def read_csv(fname, obj, **kwargs) -> pd.DataFrame:
+    """ Read the columns that obj needs from a CSV file
+
+    Args:
+        fname (str): The file name.
+        obj: An item or group.
+        kwargs: Passed to pd.read_csv.
+    """
+    return pd.read_csv(fname, usecols=obj.columns(), **kwargs)
+
+
+def read_parquet(fname, obj, **kwargs) -> pd.DataFrame:
+    """ Read the columns that obj needs from a Parquet file
+
+    Args:
+        fname (str): The file name.
+        obj: An item or group.
+        kwargs: Passed to pd.read_parquet.
+    """
+    return pd.read_parquet(fname, columns=obj.columns(), **kwargs)
+
+
+def read_feather(fname, obj, **kwargs) -> pd.DataFrame:
+    """ Read the columns that obj needs from a Feather file
+
+    Args:
+        fname (str): The file name.
+        obj: An item or group.
+        kwargs: Passed to pd.read_feather.
+    """
+    return pd.read_feather(fname, columns=obj.columns(), **kwargs)
+
+
+READERS = {
+    ".csv": read_csv,
+    ".parquet": read_parquet,
+    ".feather": read_feather,
+}
+
+
+def read(fname, obj, **kwargs) -> pd.DataFrame:
+    """ Read the columns that obj needs, choosing the reader by suffix """
+    suffix = Path(fname).suffix.lower()
+    if suffix not in READERS:
+        raise ValueError("Unsupported file type: " + suffix)
+    return READERS[suffix](fname, obj, **kwargs)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Save and load fitted items and groups.
+
+The tree is pickled (converters, fitted statistics and structure), but every
+sizeable numeric or string array inside it - converted data, group blocks,
+coded indicators - is written to its own .npy file instead. On loading, the
+arrays are memory-mapped, so nothing needs to be recomputed or even read
+until it is used.
+"""
+
+from pathlib import Path
+import pickle
+
+import numpy as np
+
+TREE_FILE = "tree.pkl"
+ARRAY_FOLDER = "arrays"
+# Arrays smaller than this are kept in the pickle
+MIN_SIZE = 1024
+# Array kinds that can be saved as .npy and memory-mapped
+MAPPABLE = "biufcmMUS"
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, folder, min_size):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._folder = folder
+        self._min_size = min_size
+        self._saved = {}
+
+    def persistent_id(self, obj):
+        if (
+            type(obj) is not np.ndarray
+            or obj.dtype.kind not in MAPPABLE
+            or obj.size < self._min_size
+        ):
+            return None
+        key = id(obj)
+        if key not in self._saved:
+            name = "{:06d}.npy".format(len(self._saved))
+            np.save(self._folder / name, obj)
+            self._saved[key] = (name, obj)  # Keep obj alive so ids are unique
+        return self._saved[key][0]
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, folder, mmap):
+        super().__init__(file)
+        self._folder = folder
+        self._mmap_mode = "r" if mmap else None
+
+    def persistent_load(self, pid):
+        arr = np.load(self._folder / pid, mmap_mode=self._mmap_mode)
+        return np.asarray(arr)
+
+
+def save(obj, folder, min_size=MIN_SIZE) -> None:
+    """ Save a fitted item or group
+
+    Args:
+        obj: The item or group. Its converters must be picklable (e.g. no
+            lambda functions).
+        folder (str): The folder to save into. It is created if needed.
+        min_size (int): Arrays with fewer elements stay in the pickle.
+    """
+    root = Path(folder)
+    arrays = root / ARRAY_FOLDER
+    arrays.mkdir(parents=True, exist_ok=True)
+    for old in arrays.glob("*.npy"):
+        old.unlink()
+    with open(root / TREE_FILE, "wb") as f:
+        _Pickler(f, arrays, min_size).dump(obj)
+
+
+def load(folder, mmap=True):
+    """ Load an item or group saved with save
+
+    Args:
+        folder (str): The folder it was saved into.
+        mmap (bool): If True (default), memory-map the arrays read-only
+            rather than reading them into memory.
+    """
+    root = Path(folder)
+    with open(root / TREE_FILE, "rb") as f:
+        obj = _Unpickler(f, root / ARRAY_FOLDER, mmap).load()
+    _synced(obj)
+    return obj
+
+
+def _synced(obj):
+    """ Let groups restore links between arrays that pickling separated """
+    if hasattr(obj, "_synced"):
+        for item in obj.items:
+            _synced(item)
+        obj._synced()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""A CSR-style ragged array for multi-coded responses."""
+
+import numpy as np
+
+
+class Ragged:
+    """ A ragged array of rows stored as flat values and row offsets
+
+    Row i holds values[offsets[i]:offsets[i + 1]], as in a CSR matrix.
+
+    Args:
+        values (np.ndarray): The values of every row, concatenated.
+        offsets (np.ndarray): Integer offsets of length n_rows + 1, starting
+            at 0 and ending at len(values).
+    """
+
+    def __init__(self, values, offsets):
+        self._values = np.asarray(values)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        if self._offsets[0] != 0 or self._offsets[-1] != len(self._values):
+            raise ValueError("Offsets do not match the values.")
+
+    @classmethod
+    def from_lists(cls, lists):
+        lengths = np.fromiter((len(lst) for lst in lists), dtype=np.int64,
+                              count=len(lists))
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.empty(offsets[-1], dtype=object)
+        values[:] = [value for lst in lists for value in lst]
+        return cls(values, offsets)
+
+    @classmethod
+    def from_arrow(cls, list_array):
+        """ Make a Ragged from a pyarrow ListArray without building lists """
+        offsets = list_array.offsets.to_numpy()
+        values = list_array.values[offsets[0]:offsets[-1]]
+        values = values.to_numpy(zero_copy_only=False)
+        return cls(values, offsets - offsets[0])
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def lengths(self):
+        return np.diff(self._offsets)
+
+    def row_ids(self):
+        """ Return the row index of every value """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return list(self._values[self._offsets[i]:self._offsets[i + 1]])
+
+    def __iter__(self):
+        values = self._values
+        offsets = self._offsets
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield list(values[start:end])
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.empty(len(self), dtype=object)
+        out[:] = self.tolist()
+        return out
+
+    def __eq__(self, other):
+        if isinstance(other, Ragged):
+            return (np.array_equal(self._offsets, other._offsets)
+                    and np.array_equal(self._values, other._values))
+        return NotImplemented
+
+    def __repr__(self):
+        return (self.__class__.__name__ + " with " + str(len(self))
+                + " rows and " + str(len(self._values)) + " values")
+
+    def tolist(self):
+        return list(self)
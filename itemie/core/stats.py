@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Mergeable summary statistics and frequency counts."""
+
+import numpy as np
+import pandas as pd
+
+
+Z95 = 1.95996
+
+
+def _scalar(x):
+    x = np.asarray(x)
+    return x[()] if x.ndim == 0 else x
+
+
+def segment_codes(df, by):
+    """ Factorise segment keys once
+
+    Args:
+        df (pd.DataFrame): The data.
+        by (str | array-like): A column name in df, or the segment of each
+            row.
+
+    Returns:
+        tuple: The integer code of each row (-1 where the segment is
+        missing), the sorted segment labels, and the index name.
+    """
+    if isinstance(by, str):
+        keys, name = df[by], by
+    else:
+        keys, name = by, "segment"
+    codes, labels = pd.factorize(pd.Series(np.asarray(keys)), sort=True)
+    return codes, pd.Index(labels, name=name), name
+
+
+# Whole-number data spanning more values than this is factorised instead
+MAX_SPAN = 1 << 16
+
+
+def level_counts(data, codes=None, n_groups=1):
+    """ Count each value in every column with one bincount
+
+    Whole-number data, such as Likert answers, is counted directly by value.
+    Other data is factorised first. Missing values are counted in their own
+    bucket.
+
+    Args:
+        data (array-like): 1-D or respondents × columns data.
+        codes (np.ndarray): Optional segment code of each row, from
+            segment_codes. Rows with a code of -1 are ignored.
+        n_groups (int): The number of segments.
+
+    Returns:
+        tuple: The sorted levels present, and the counts shaped
+        columns × (levels + 1), or segments × columns × (levels + 1) when
+        codes are given. The missing count is last.
+    """
+    x = np.asarray(data, dtype=float)
+    if x.ndim == 1:
+        x = x[:, None]
+    missing = np.isnan(x)
+    present = x[~missing]
+    if (present.size and np.all(present == np.round(present))
+            and present.max() - present.min() < MAX_SPAN):
+        lo = present.min()
+        span = int(present.max() - lo) + 1
+        levels = lo + np.arange(span)
+        idx = np.where(missing, span, x - lo).astype(np.intp)
+    else:
+        levels, inverse = np.unique(present, return_inverse=True)
+        span = len(levels)
+        idx = np.full(x.shape, span, dtype=np.intp)
+        idx[~missing] = inverse.ravel()
+    width = span + 1
+    n_cols = x.shape[1]
+    idx += np.arange(n_cols) * width
+    if codes is None:
+        shape = (n_cols, width)
+    else:
+        codes = np.asarray(codes)
+        keep = codes >= 0
+        idx = idx[keep] + codes[keep, None] * (n_cols * width)
+        shape = (n_groups, n_cols, width)
+    counts = np.bincount(idx.ravel(), minlength=int(np.prod(shape)))
+    counts = counts.reshape(shape)
+    # Drop the gaps between whole-number levels nobody answered
+    used = np.append(counts.reshape(-1, width).any(axis=0)[:-1], True)
+    return levels[used[:-1]], counts[..., used]
+
+
+def count_labels(levels, as_int=True) -> list:
+    """ Return labels for the level counts, ending with 'na' """
+    return [int(v) if as_int else v for v in levels] + ["na"]
+
+
+class Moments:
+    """ Mergeable NaN-aware summary statistics
+
+    Holds the count, mean, sum of squared deviations (M2), min and max of
+    some data. Statistics for chunks of data can be merged with Chan's
+    parallel update, so large data never needs to be loaded at once.
+
+    For 2-D data, statistics are computed for each column.
+    """
+
+    def __init__(self, count, mean, m2, min, max):
+        self.count = _scalar(count)
+        self.mean = _scalar(mean)
+        self.m2 = _scalar(m2)
+        self.min = _scalar(min)
+        self.max = _scalar(max)
+
+    @classmethod
+    def from_array(cls, data):
+        x = np.asarray(data, dtype=float)
+        missing = np.isnan(x)
+        count = x.shape[0] - np.count_nonzero(missing, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(missing, 0.0, x).sum(axis=0) / count
+            dev = np.where(missing, 0.0, x - mean)
+            m2 = np.einsum("i...,i...->...", dev, dev)
+        mn = np.fmin.reduce(x, axis=0, initial=np.inf)
+        mx = np.fmax.reduce(x, axis=0, initial=-np.inf)
+        empty = count == 0
+        return cls(
+            count,
+            np.where(empty, np.nan, mean),
+            np.where(empty, np.nan, m2),
+            np.where(empty, np.nan, mn),
+            np.where(empty, np.nan, mx),
+        )
+
+    @classmethod
+    def from_groups(cls, data, codes, n_groups):
+        """ Return Moments for each group of rows of data
+
+        Rows are sorted by group once, then every statistic is a single
+        reduceat over the sorted rows, so the cost grows with the number of
+        rows, not rows × groups. The results have a leading group axis.
+
+        Args:
+            data (array-like): 1-D or 2-D (rows × columns) data.
+            codes (np.ndarray): The group code of each row, from 0 to
+                n_groups - 1. Rows with negative codes are ignored.
+            n_groups (int): The number of groups.
+        """
+        x = np.asarray(data, dtype=float)
+        codes = np.asarray(codes)
+        keep = codes >= 0
+        x, codes = x[keep], codes[keep]
+        order = np.argsort(codes, kind="stable")
+        x, codes = x[order], codes[order]
+        sizes = np.bincount(codes, minlength=n_groups)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        shape = (n_groups,) + x.shape[1:]
+        present = sizes > 0
+        idx = starts[present]
+
+        def reduce(ufunc, values, fill):
+            out = np.full(shape, fill, dtype=float)
+            if len(idx):
+                out[present] = ufunc.reduceat(values, idx, axis=0)
+            return out
+
+        missing = np.isnan(x)
+        filled = np.where(missing, 0.0, x)
+        count = reduce(np.add, (~missing).astype(float), 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = reduce(np.add, filled, 0.0) / count
+            dev = np.where(missing, 0.0, x - mean[codes])
+            m2 = reduce(np.add, dev * dev, 0.0)
+        mn = reduce(np.fmin, x, np.nan)
+        mx = reduce(np.fmax, x, np.nan)
+        empty = count == 0
+        return cls(
+            count.astype(np.int64),
+            np.where(empty, np.nan, mean),
+            np.where(empty, np.nan, m2),
+            mn,
+            mx,
+        )
+
+    @classmethod
+    def stack(cls, moments_list):
+        """ Combine scalar Moments into one with an entry for each """
+        return cls(
+            np.array([m.count for m in moments_list]),
+            np.array([m.mean for m in moments_list], dtype=float),
+            np.array([m.m2 for m in moments_list], dtype=float),
+            np.array([m.min for m in moments_list], dtype=float),
+            np.array([m.max for m in moments_list], dtype=float),
+        )
+
+    def merge(self, other):
+        """ Return the statistics of both sets of data combined """
+        na, nb = self.count, other.count
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            mean = self.mean + delta * nb / n
+            m2 = self.m2 + other.m2 + delta**2 * na * nb / n
+        mean = np.where(na == 0, other.mean, np.where(nb == 0, self.mean, mean))
+        m2 = np.where(na == 0, other.m2, np.where(nb == 0, self.m2, m2))
+        return Moments(
+            n,
+            mean,
+            m2,
+            np.fmin(self.min, other.min),
+            np.fmax(self.max, other.max),
+        )
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    @property
+    def ci95(self):
+        """ The half-width of the 95% confidence interval of the mean """
+        return _scalar(self.sem * Z95)
+
+    def table(self):
+        """ Return the labels and values of the summary statistics """
+        labels = ["mean", "std", "min", "max", "sem", "ci95", "n"]
+        values = [self.mean, self.std(), self.min, self.max, self.sem,
+                  self.ci95, self.count]
+        return labels, values
+
+    def var(self, ddof=0):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return _scalar(self.m2 / (self.count - ddof))
+
+    def std(self, ddof=0):
+        return _scalar(np.sqrt(self.var(ddof)))
+
+    @property
+    def sem(self):
+        """ The standard error of the mean of the non-missing values """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return _scalar(self.std(ddof=1) / np.sqrt(self.count))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Streaming fit and transform for survey exports too large to load at once.
+
+Typical use, reading each file twice so that the transform uses statistics
+fitted on all of the data:
+
+    stream.fit(grp, stream.read_csv_chunks(fname, grp))
+    frames = stream.transform(grp, stream.read_csv_chunks(fname, grp))
+    stream.write(frames, 'out.parquet')
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+
+def read_csv_chunks(fname, obj=None, chunksize=100_000, **kwargs):
+    """ Yield DataFrame chunks of a CSV file
+
+    Args:
+        fname (str): The file name.
+        obj: An item or group. If given, only the columns it reads are
+            parsed.
+        chunksize (int): The number of rows per chunk.
+        kwargs: Passed to pd.read_csv.
+    """
+    if obj is not None:
+        kwargs["usecols"] = obj.columns()
+    with pd.read_csv(fname, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
+
+
+def read_parquet_chunks(fname, obj=None, batch_size=100_000):
+    """ Yield DataFrame chunks of a Parquet file
+
+    Args:
+        fname (str): The file name.
+        obj: An item or group. If given, only the columns it reads are
+            loaded.
+        batch_size (int): The maximum number of rows per chunk.
+    """
+    import pyarrow.parquet as pq
+    columns = None if obj is None else obj.columns()
+    parquet = pq.ParquetFile(fname)
+    for batch in parquet.iter_batches(batch_size=batch_size,
+                                      columns=columns):
+        yield batch.to_pandas()
+
+
+def fit(obj, chunks) -> None:
+    """ Fit an item or group one chunk at a time
+
+    Fitted statistics are merged across chunks with partial_fit, so only one
+    chunk is held in memory at a time. Statistics are merged with any that
+    obj has already fitted, so start from an unfitted obj.
+    """
+    columns = obj.columns()
+    for chunk in chunks:
+        obj.partial_fit(chunk[columns])
+
+
+def transform(obj, chunks, typ="default"):
+    """ Transform an item or group one chunk at a time
+
+    Yields:
+        pd.DataFrame: The data_df for each chunk, keeping the chunk's index.
+    """
+    columns = obj.columns()
+    for chunk in chunks:
+        obj.transform(chunk[columns])
+        df = obj.data_df(typ=typ)
+        df.index = chunk.index
+        df.index.name = "response"
+        yield df
+
+
+def write(frames, fname) -> None:
+    """ Write DataFrame chunks to a single CSV or Parquet file
+
+    The format comes from the file suffix. Each chunk is written as it
+    arrives, so only one is held in memory at a time.
+    """
+    fname = Path(fname)
+    if fname.suffix == ".parquet":
+        _write_parquet(frames, fname)
+    elif fname.suffix == ".csv":
+        header = True
+        for df in frames:
+            df.to_csv(fname, mode="w" if header else "a", header=header)
+            header = False
+    else:
+        raise ValueError("Unsupported file type: " + fname.suffix)
+
+
+def _write_parquet(frames, fname):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for df in frames:
+            table = pa.Table.from_pandas(df)
+            if writer is None:
+                writer = pq.ParquetWriter(fname, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Mergeable counts of phrases and other open-ended values."""
+
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+from .ragged import Ragged
+
+
+def flatten(data) -> np.ndarray:
+    """ Return every value in some converted data as one flat array
+
+    Args:
+        data: A Ragged, or a sequence where each entry is a list of values
+            or a single value.
+    """
+    if isinstance(data, Ragged):
+        return data.values
+    values = [
+        value
+        for obj in data
+        for value in (obj if isinstance(obj, list) else [obj])
+    ]
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+def count_values(values) -> Counter:
+    """ Count each distinct value with one factorise and bincount
+
+    Missing values are not counted.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    return Counter(dict(zip(uniques.tolist(), counts.tolist())))
+
+
+class TopK:
+    """ A bounded-memory summary of the k most frequent values
+
+    This is a mergeable Space-Saving sketch. Only k values are monitored.
+    Each monitored count may overestimate the true count, by at most its
+    error. Values that are not monitored occur at most floor times, so any
+    value occurring more than floor times is guaranteed to be monitored.
+
+    Summaries of chunks or survey waves can be merged with + in any order.
+    Values are counted exactly in slices of at most chunksize, and each
+    slice's summary is merged in, so memory is bounded by chunksize + k
+    however many distinct values there are.
+
+    Args:
+        k (int): The number of values to monitor.
+        chunksize (int): The number of values counted exactly at a time.
+    """
+
+    def __init__(self, k: int, chunksize: int = 65536):
+        self.k = k
+        self.chunksize = chunksize
+        self._counts = pd.Series(dtype=np.int64)
+        self._errors = pd.Series(dtype=np.int64)
+        self.floor = 0
+
+    @classmethod
+    def from_counts(cls, counts, k: int, chunksize: int = 65536):
+        """ Make a summary from exact counts, such as a Counter """
+        out = cls(k, chunksize)
+        counts = pd.Series(counts, dtype=np.int64)
+        out._truncate(counts, pd.Series(0, index=counts.index), 0)
+        return out
+
+    @classmethod
+    def from_values(cls, values, k: int, chunksize: int = 65536):
+        out = cls(k, chunksize)
+        out.update(values)
+        return out
+
+    def _truncate(self, counts, errors, floor):
+        order = np.argsort(-counts.to_numpy(), kind="stable")
+        if len(order) > self.k:
+            floor = max(floor, int(counts.iloc[order[self.k]]))
+            order = order[:self.k]
+        self._counts = counts.iloc[order]
+        self._errors = errors.iloc[order]
+        self.floor = floor
+
+    def merge(self, other: "TopK") -> "TopK":
+        """ Return the summary of both summaries' data """
+        out = TopK(min(self.k, other.k), self.chunksize)
+        index = self._counts.index.union(other._counts.index, sort=False)
+        counts = (self._counts.reindex(index, fill_value=self.floor)
+                  + other._counts.reindex(index, fill_value=other.floor))
+        errors = (self._errors.reindex(index, fill_value=self.floor)
+                  + other._errors.reindex(index, fill_value=other.floor))
+        out._truncate(counts, errors, self.floor + other.floor)
+        return out
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def update(self, values) -> None:
+        """ Add values to the summary, one slice of chunksize at a time """
+        for start in range(0, len(values), self.chunksize):
+            part = values[start:start + self.chunksize]
+            merged = self.merge(TopK.from_counts(count_values(part), self.k))
+            self.__dict__.update(merged.__dict__)
+
+    def counts(self) -> dict:
+        """ Return the estimated counts, most frequent first """
+        return dict(zip(self._counts.index, self._counts.tolist()))
+
+    def errors(self) -> dict:
+        """ Return the largest overestimate of each count """
+        return dict(zip(self._errors.index, self._errors.tolist()))
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __repr__(self):
+        return "TopK(k=" + str(self.k) + ", floor=" + str(self.floor) + ")"
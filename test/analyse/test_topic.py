@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.analyse.topic, with spaCy and gensim stood in for."""
+import pytest
+
+from itemie.analyse import topic
+
+
+class FakeVocab(dict):
+    def __missing__(self, key):
+        lexeme = self[key] = type("Lexeme", (), {"is_stop": False})()
+        return lexeme
+
+
+class FakeWord:
+    def __init__(self, text):
+        self.text = text
+        self.lower_ = self.lemma_ = text.lower()
+        # As in a worker process, stopwords added at runtime are not set
+        self.is_stop = self.lower_ == "the"
+        self.is_punct = text in ",."
+        self.like_num = text.isdigit()
+
+
+class FakeNLP:
+    """ Stands in for a spaCy pipeline, recording each call to pipe """
+    pipe_names = ["tok2vec", "tagger", "parser", "attribute_ruler",
+                  "lemmatizer", "ner"]
+
+    def __init__(self):
+        self.vocab = FakeVocab()
+        self.piped = []
+
+    def pipe(self, texts, **kwargs):
+        texts = list(texts)
+        self.piped.append((texts, kwargs))
+        return ([FakeWord(w) for w in text.split()] for text in texts)
+
+
+@pytest.fixture
+def nlp(monkeypatch):
+    nlp = FakeNLP()
+    monkeypatch.setattr(topic, "_NLP", nlp)
+    monkeypatch.setattr(topic, "_STOPWORDS", set(topic.EXTRA_STOPWORDS))
+    monkeypatch.setattr(topic.Topics, "_make_bigrams",
+                        lambda self, texts: texts)
+    return nlp
+
+
+class TestGetTexts:
+    def test_disabled(self, nlp):
+        topic.Topics(n_process=4, batch_size=50)._get_texts(["a"])
+        topic.Topics(lemmatize=False)._get_texts(["a"])
+        lemma, text = [kwargs for _, kwargs in nlp.piped]
+        assert lemma == {"n_process": 4, "batch_size": 50,
+                         "disable": ["parser", "ner"]}
+        assert text["disable"] == nlp.pipe_names
+
+    def test_tokens(self, nlp):
+        topic.add_stopwords(["cats"])
+        texts = topic.Topics()._get_texts(["The Cats , 3 Dogs nan"])
+        assert texts == [["dogs"]]
+
+    def test_dedupe(self, nlp):
+        data = ["b c", "a", "b c", "a", "d"]
+        texts = topic.Topics(dedupe=True, lemmatize=False)._get_texts(data)
+        assert texts == [["b", "c"], ["a"], ["b", "c"], ["a"], ["d"]]
+        [(piped, _)] = nlp.piped
+        assert piped == ["b c", "a", "d"]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """ Stand in for spaCy and gensim preprocessing, recording each run """
+    calls = []
+
+    def get_texts(self, lin_data):
+        calls.append(list(lin_data))
+        return [text.split() for text in lin_data]
+
+    def make_corpus(self, texts):
+        return "dictionary", [len(text) for text in texts]
+
+    monkeypatch.setattr(topic.Topics, "_get_texts", get_texts)
+    monkeypatch.setattr(topic.Topics, "_make_corpus", make_corpus)
+    monkeypatch.setattr(topic, "_STOPWORDS", set(topic.EXTRA_STOPWORDS))
+    topic.clear_cache()
+    yield calls
+    topic.clear_cache()
+
+
+class TestPreprocess:
+    def test_cached(self, calls):
+        first = topic.Topics().preprocess(["a b", "c"])
+        second = topic.Topics(n_process=2).preprocess(["a b", "c"])
+        assert second is first
+        assert first[2] == [2, 1]
+        assert len(calls) == 1
+
+    def test_settings_and_data_in_key(self, calls):
+        topic.Topics().preprocess(["a b", "c"])
+        topic.Topics(tfidf=False).preprocess(["a b", "c"])
+        topic.Topics().preprocess(["a b", "d"])
+        assert len(calls) == 3
+
+    def test_stopwords_in_key(self, calls, monkeypatch):
+        monkeypatch.setattr(topic, "_NLP",
+                            type("NLP", (), {"vocab": FakeVocab()})())
+        topic.Topics().preprocess(["a b"])
+        topic.add_stopwords(["b"])
+        assert topic._NLP.vocab["b"].is_stop
+        topic.Topics().preprocess(["a b"])
+        assert len(calls) == 2
+
+    def test_lru(self, calls, monkeypatch):
+        monkeypatch.setattr(topic, "CORPUS_CACHE_SIZE", 2)
+        for text in ["a", "b", "a", "c", "a", "b"]:
+            topic.Topics().preprocess([text])
+        assert calls == [["a"], ["b"], ["c"], ["b"]]
+
+    def test_cache_dir(self, calls, monkeypatch, tmp_path):
+        disk = {}
+
+        def save(folder, cached):
+            disk[folder] = cached
+
+        monkeypatch.setattr(topic.Topics, "_save_cached", staticmethod(save))
+        monkeypatch.setattr(topic.Topics, "_load_cached",
+                            staticmethod(disk.get))
+        first = topic.Topics(cache_dir=tmp_path).preprocess(["a b"])
+        [folder] = disk
+        assert folder.parent == tmp_path
+        topic.clear_cache()
+        second = topic.Topics(cache_dir=tmp_path).preprocess(["a b"])
+        assert second is first
+        assert len(calls) == 1
+
+
+class FakeItem:
+    def values(self, typ):
+        return ["a b", "c"]
+
+    def linearised(self, data):
+        return data, [0, 1]
+
+
+@pytest.fixture
+def scores(calls, monkeypatch):
+    """ Stand in for LDA training and coherence, with set scores """
+    scores = {}
+
+    def train_lda(corpus, dictionary, num_topics, random_state, workers):
+        return ("model", num_topics, random_state)
+
+    def coherence(model, texts, dictionary, typ, processes=-1):
+        return scores[model[1:]]
+
+    monkeypatch.setattr(topic, "train_lda", train_lda)
+    monkeypatch.setattr(topic, "coherence", coherence)
+    return scores
+
+
+class TestSweep:
+    def test_ranked(self, scores, calls):
+        scores.update({(2, 0): 0.3, (2, 1): 0.5, (3, 0): 0.4, (3, 1): 0.1})
+        topics = topic.Topics()
+        table = topics.sweep(FakeItem(), num_topics=[2, 3], seeds=[0, 1],
+                             n_jobs=1)
+        assert table.values.tolist() == [[2, 1, 0.5], [3, 0, 0.4],
+                                         [2, 0, 0.3], [3, 1, 0.1]]
+        assert topics._model == ("model", 2, 1)
+        assert topics._num_topics == 2
+        assert topics._texts == [["a", "b"], ["c"]]
+        assert topics._corpus == [2, 1]
+        assert topics.mapping == [0, 1]
+        assert len(calls) == 1
+
+    def test_nan(self, scores):
+        scores.update({(2, 0): float("nan"), (3, 0): 0.2, (4, 0): 0.1})
+        topics = topic.Topics()
+        table = topics.sweep(FakeItem(), num_topics=[2, 3, 4], n_jobs=1)
+        assert table["num_topics"].tolist() == [3, 4, 2]
+        assert topics._model == ("model", 3, 0)
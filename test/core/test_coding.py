@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.coding."""
+import pytest
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from itemie.core.coding import Indicators
+
+
+ROWS = [0, 0, 1, 2, 2, 2]
+CODES = ["x", "y", "z", "y", np.nan, "y"]
+
+
+class TestIndicators:
+    @pytest.mark.parametrize("sparse", [False, True])
+    def test_to_df(self, sparse):
+        if sparse:
+            pytest.importorskip("scipy")
+        ind = Indicators(ROWS, CODES, sparse=sparse)
+        df = ind.to_df(prefix="c_", sparse=False)
+        assert list(df.columns) == ["c_x", "c_y", "c_z", "c_count"]
+        assert df["c_x"].values == approx([1, 0, 0])
+        assert df["c_y"].values == approx([1, 0, 1])
+        assert df["c_count"].values == approx([2, 1, 1])
+
+    @pytest.mark.parametrize("sparse", [False, True])
+    def test_exclude(self, sparse):
+        if sparse:
+            pytest.importorskip("scipy")
+        ind = Indicators(ROWS, CODES, exclude=["y"], sparse=sparse)
+        assert list(ind.codes) == ["x", "z"]
+        assert ind.n_codes() == approx([1, 1, 0])
+
+    def test_present_fill(self):
+        ind = Indicators(ROWS, CODES)
+        df = ind.to_df(present_value=2, fill_value=-1)
+        assert df["x"].values == approx([2, -1, -1])
+        assert df["count"].values == approx([3, 0, 0])
+
+    def test_sparse_columns(self):
+        pytest.importorskip("scipy")
+        ind = Indicators(ROWS, CODES, sparse=True)
+        df = ind.to_df()
+        assert isinstance(df["x"].dtype, pd.SparseDtype)
+        assert df["x"].sparse.to_dense().values == approx([1, 0, 0])
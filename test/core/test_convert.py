@@ -5,6 +5,8 @@ Created on Thu Oct 19 18:01:05 2023
 @author: Reuben
 """
 
+import json
+
 import pytest
 import numpy as np
 import pandas as pd
@@ -20,8 +22,135 @@ class TestReplace:
         converted = converter.convert(data)
         expected = np.array([1.0, 2.0, 1.0, 1.0, 2.0])
         assert converted == approx(expected)
+
+    def test_convert_numeric_dtype(self):
+        keyvals = {"apple": 1, "pear": 2}
+        converter = convert.Replace(keyvals)
+        data = np.array(["apple", "pear", "apple"])
+        converted = converter.convert(data)
+        assert converted.dtype.kind == "i"
+        assert list(converted) == [1, 2, 1]
+
+    def test_convert_other(self):
+        keyvals = {"apple": "a"}
+        converter = convert.Replace(keyvals, other_val="x")
+        data = np.array(["apple", "pear", "fig", "apple"])
+        converted = converter.convert(data)
+        assert list(converted) == ["a", "x", "x", "a"]
+
+    def test_convert_no_group_other(self):
+        keyvals = {"apple": "a"}
+        converter = convert.Replace(keyvals, group_other=False)
+        data = pd.Series(["apple", "pear", "fig", "apple"])
+        converted = converter.convert(data)
+        assert list(converted) == ["a", "pear", "fig", "a"]
+
+    def test_convert_missing_keys(self):
+        converter = convert.Replace({None: "missing"}, group_other=False)
+        data = pd.Series([None, np.nan, "a", None], dtype=object)
+        converted = converter.convert(data)
+        assert list(converted[[0, 2, 3]]) == ["missing", "a", "missing"]
+        assert converted[1] == "nan"
         
         
+class TestElementwiseConverter:
+    def test_convert_unique_once(self):
+        calls = []
+
+        def func(v):
+            calls.append(v)
+            return v * 2
+
+        converter = convert.Function(func)
+        converted = converter.convert(np.array([1, 2, 1, 1, 2]))
+        assert list(converted) == [2, 4, 2, 2, 4]
+        assert sorted(calls) == [1, 2]
+
+    def test_convert_mixed_types(self):
+        converter = convert.Function(lambda v: type(v).__name__)
+        converted = converter.convert(np.array([True, 1, 1.0], dtype=object))
+        assert list(converted) == ["bool", "int", "float"]
+
+    def test_convert_python_scalars(self):
+        converter = convert.Function(json.dumps)
+        assert list(converter.convert(pd.Series([1, 2, 1]))) == ["1", "2", "1"]
+        converter = convert.Function(lambda v: "yes" if v is True else "no")
+        converted = converter.convert(pd.Series([True, False, True]))
+        assert list(converted) == ["yes", "no", "yes"]
+        converter = convert.Function(lambda v: isinstance(v, float))
+        assert converter.convert(pd.Series([1.5, np.nan])).all()
+
+    def test_convert_lists(self):
+        converter = convert.Function(len, cache_size=10)
+        assert list(converter.convert([[1, 2], [3], [1, 2]])) == [2, 1, 2]
+
+    def test_cache(self):
+        converter = convert.Lower(cache_size=2)
+        converter.convert(np.array(["A", "B", "A"]))
+        info = converter.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (0, 2, 2)
+        converted = converter.convert(np.array(["B", "C"]))
+        assert list(converted) == ["b", "c"]
+        info = converter.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (1, 3, 2)
+
+    def test_clear_cache(self):
+        converter = convert.Lower(cache_size=10)
+        converter.convert(np.array(["A", "B"]))
+        converter.clear_cache()
+        assert converter.cache_info() == (0, 0, 10, 0)
+
+
+class TestStrReplace:
+    def test_convert(self):
+        keyvals = {"&": "and", "svc": "service"}
+        converter = convert.StrReplace(keyvals)
+        data = np.array(["svc & staff", "ok", "&&"])
+        converted = converter.convert(data)
+        assert list(converted) == ["service and staff", "ok", "andand"]
+
+    def test_convert_bulk(self):
+        keyvals = {"a": "b", "b": "c", "ab": "x"}
+        data = np.array(["abba", "cab", ""])
+        expected = convert.StrReplace(keyvals).convert(data)
+        converted = convert.StrReplace(keyvals, bulk=True).convert(data)
+        assert list(converted) == list(expected) == ["xcb", "cx", ""]
+
+
+class TestSplitter:
+    def test_convert(self):
+        converter = convert.Splitter([",", " and "])
+        data = np.array(["a, b and c", " d ", "e,,f"])
+        converted = converter.convert(data)
+        assert converted == [["a", "b", "c"], ["d"], ["e", "", "f"]]
+
+    def test_convert_bulk(self):
+        data = np.array(["a, b and c", " d ", "e,,f"])
+        expected = convert.Splitter([",", " and "]).convert(data)
+        converted = convert.Splitter([",", " and "], bulk=True).convert(data)
+        assert converted == expected
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_convert_ragged(self, bulk):
+        data = np.array(["a, b and c", " d ", "e,,f"])
+        converter = convert.Splitter([",", " and "], bulk=bulk, ragged=True)
+        converted = converter.convert(data)
+        assert list(converted.values) == ["a", "b", "c", "d", "e", "", "f"]
+        assert list(converted.offsets) == [0, 3, 4, 7]
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_convert_ends(self, bulk):
+        data = np.array([" and x and ", "a and ", "a, and b"])
+        converter = convert.Splitter([",", " and "], bulk=bulk)
+        converted = converter.convert(data)
+        assert converted == [["", "x", ""], ["a", ""], ["a", "", "b"]]
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_convert_no_splits(self, bulk):
+        converter = convert.Splitter([], bulk=bulk)
+        assert converter.convert(np.array(["a b ", "c"])) == [["a b"], ["c"]]
+
+
 class TestAutoCorrect:
     def test_convert(self):
         converter = convert.AutoCorrect()
@@ -30,6 +159,34 @@ class TestAutoCorrect:
         expected = np.array(["apple", "pear", "apple"])
         print(converted)
         assert converted == approx(expected)
+
+    def test_convert_parallel(self):
+        data = np.array(["apple", "pear", "applee", "bananna", "pear"])
+        expected = convert.AutoCorrect().convert(data)
+        converter = convert.AutoCorrect(n_jobs=2, chunksize=1)
+        converted = converter.convert(data)
+        assert list(converted) == list(expected)
+
+    def test_convert_disk_cache(self, tmp_path, monkeypatch):
+        fname = tmp_path / "autocorrect.sqlite"
+        data = np.array(["apple", "applee", "pear"])
+        first = convert.AutoCorrect(cache_path=fname).convert(data)
+        monkeypatch.setattr(convert, "_correct_text", None)
+        second = convert.AutoCorrect(cache_path=fname).convert(data)
+        assert list(second) == list(first) == ["apple", "apple", "pear"]
+
+    def test_pipeline_disk_cache(self, tmp_path, monkeypatch):
+        fname = tmp_path / "autocorrect.sqlite"
+        data = np.array(["Apple", "applee", "APPLEE", "pear"])
+
+        def make():
+            return convert.Pipeline(convert.Lower(),
+                                    convert.AutoCorrect(cache_path=fname))
+
+        first = make().convert(data)
+        monkeypatch.setattr(convert, "_correct_text", None)
+        second = make().convert(data)
+        assert list(second) == list(first) == ["apple"] * 3 + ["pear"]
         
         
 class TestPipeline:
@@ -42,4 +199,43 @@ class TestPipeline:
         converted = converter.convert(data)
         expected = np.array([1.0, 2.0, 1.0, 1.0, 2.0])
         print(converted)
-        assert converted == approx(expected)
\ No newline at end of file
+        assert converted == approx(expected)
+
+    def test_convert_fused(self):
+        converter = convert.Pipeline(
+            convert.Lower(),
+            convert.StrReplace({" ": ""}),
+            convert.Replace({"agree": 1.0, "disagree": 0.0}),
+            convert.AsType(float),
+        )
+        data = np.array(["Agree", "DIS agree", "agree ", "Agree"])
+        converted = converter.convert(data)
+        assert converted == approx(np.array([1.0, 0.0, 1.0, 1.0]))
+
+    def test_convert_split_function(self):
+        converter = convert.Pipeline(convert.Splitter([","]),
+                                     convert.Function(len))
+        converted = converter.convert(np.array(["a, b", "c", "d,e,f"]))
+        assert list(converted) == [2, 1, 3]
+
+    def test_convert_not_unique(self):
+        converter = convert.Pipeline(
+            convert.Lower(), convert.StrReplace({"a": "b"}), unique=False
+        )
+        data = np.array(["A", "Ca", "a"])
+        converted = converter.convert(data)
+        assert list(converted) == ["b", "cb", "b"]
+
+    def test_explain(self):
+        converter = convert.Pipeline(
+            convert.Lower(),
+            convert.StrReplace({" ": ""}),
+            convert.AsType(str),
+            convert.Pipeline(convert.Lower()),
+        )
+        expected = (
+            "1. fused over unique values: Lower -> StrReplace\n"
+            "2. AsType\n"
+            "3. Lower"
+        )
+        assert converter.explain() == expected
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.group."""
+import pytest
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from itemie.core import item, group, convert
+
+
+@pytest.fixture
+def df():
+    data = np.array([[1, 2, 3, 4], [2, 3, 4, 5], [1, 2, 5, 4], [3, 1, 2, 2]])
+    return pd.DataFrame(data, columns=["q_a", "q_b", "q_c", "q_d"]).astype(
+        float
+    )
+
+
+@pytest.fixture
+def numericgroup(df):
+    grp = group.NumericGroup(name="fruit", pref="q_", item_cls=item.NumericItem)
+    for name in ["a", "b", "c", "d"]:
+        grp.add_item(name=name, key=name)
+    grp.fit_transform(df)
+    return grp
+
+
+class TestNumericGroup:
+    def test_standardised(self, numericgroup, df):
+        x = df.values
+        expected = np.mean((x - x.mean(axis=0)) / x.std(axis=0), axis=1)
+        assert numericgroup.standardised == approx(expected)
+
+    def test_standardised_cached(self, numericgroup, df):
+        first = numericgroup.standardised
+        assert numericgroup.standardised is first
+        numericgroup["a"].fit_transform(df * 2)
+        assert numericgroup.standardised is not first
+
+    def test_view_dtype(self, df):
+        grp = group.NumericGroup(
+            name="fruit",
+            pref="q_",
+            item_cls=item.NumericItem,
+            view_dtype=np.float32,
+        )
+        grp.add_item(name="a", key="a")
+        grp.fit_transform(df)
+        assert grp.standardised.dtype == np.float32
+
+
+@pytest.fixture
+def matrixgroup(df):
+    grp = group.NumericGroup(
+        name="fruit", pref="q_", item_cls=item.NumericItem, matrix=True
+    )
+    for name in ["a", "b", "c", "d"]:
+        grp.add_item(name=name, key=name)
+    grp.fit_transform(df)
+    return grp
+
+
+class TestMatrixGroup:
+    def test_block(self, matrixgroup, df):
+        block = matrixgroup.block
+        assert block == approx(df.values)
+        assert block.flags.f_contiguous
+        assert np.shares_memory(matrixgroup["b"].converted, block)
+
+    def test_same_as_items(self, matrixgroup, numericgroup):
+        for typ in ["standardised", "normalised", "converted"]:
+            expected = numericgroup.values(typ)
+            assert matrixgroup.values(typ) == approx(expected)
+        assert matrixgroup.means() == approx(numericgroup.means())
+        assert matrixgroup.data_df().values == approx(
+            numericgroup.data_df().values
+        )
+
+
+class TestBatchedFit:
+    def test_shared_converter(self):
+        df = pd.DataFrame(
+            {
+                "q_a": ["yes", "no", "yes"],
+                "q_b": ["no", "no", "maybe"],
+                "q_c": ["yes", "yes", "no"],
+            }
+        )
+        converter = convert.Replace({"yes": 1.0, "no": 0.0}, other_val=0.5)
+        calls = []
+        original = converter.convert_block
+
+        def convert_block(columns):
+            calls.append(len(columns))
+            return original(columns)
+
+        converter.convert_block = convert_block
+        grp = group.NumericGroup(
+            name="answers",
+            pref="q_",
+            item_cls=item.NumericItem,
+            converter=converter,
+        )
+        for name in ["a", "b", "c"]:
+            grp.add_item(name=name, key=name)
+        grp.fit_transform(df)
+        assert calls == [3]
+        for name in ["a", "b", "c"]:
+            single = item.NumericItem(name=name, key="q_" + name,
+                                      converter=converter)
+            single.fit_transform(df)
+            assert grp[name].converted == approx(single.converted)
+            assert grp[name].raw.values.tolist() == df["q_" + name].tolist()
+            assert grp[name].mean == approx(single.mean)
+
+    @pytest.mark.parametrize("converter", [
+        convert.AsType(str),
+        convert.Replace({"x": 1, "y": 2}, group_other=False),
+        convert.Replace({1: "one"}, group_other=False),
+    ])
+    def test_mixed_dtypes(self, converter):
+        df = pd.DataFrame({
+            "q_a": [1, 2, 3],
+            "q_b": [1.5, np.nan, 2.0],
+            "q_c": ["x", "y", "x"],
+            "q_d": ["x", "y", "z"],
+        })
+        grp = group.Group(name="mixed", pref="q_", converter=converter)
+        for name in ["a", "b", "c", "d"]:
+            grp.add_item(name=name, key=name, cls=item.Item)
+        grp.fit_transform(df)
+        for name in ["a", "b", "c", "d"]:
+            single = item.Item(name=name, key="q_" + name,
+                               converter=converter)
+            single.fit_transform(df)
+            converted = grp[name].converted
+            assert converted.dtype == single.converted.dtype
+            assert pd.Series(converted).equals(pd.Series(single.converted))
+
+    def test_mixed_converters(self, df):
+        grp = group.NumericGroup(name="fruit", pref="q_",
+                                 item_cls=item.NumericItem)
+        grp.add_item(name="a", key="a")
+        grp.add_item(name="b", key="b", converter=convert.AsType(float))
+        grp.add_item(name="c", key="c")
+        grp.fit_transform(df)
+        assert grp.names == ["a", "b", "c"]
+        assert grp["c"].converted.values == approx(df["q_c"].values)
+        assert grp["b"].converted == approx(df["q_b"].values)
+
+
+def _make_survey(executor=None):
+    grp = group.Group(name="survey", executor=executor, n_jobs=2)
+    likert = grp.add_group(
+        name="likert",
+        pref="q_",
+        cls=group.NumericGroup,
+        item_cls=item.NumericItem,
+        matrix=True,
+    )
+    for name in ["a", "b", "c"]:
+        likert.add_item(name=name, key=name)
+    grp.add_item(name="d", key="q_d", cls=item.NumericItem,
+                 converter=convert.AsType(float))
+    grp.add_item(name="text", key="text", cls=item.Item,
+                 converter=convert.Lower())
+    return grp
+
+
+class TestExecutor:
+    @pytest.mark.parametrize("executor", ["thread", "process"])
+    def test_same_as_sequential(self, df, executor):
+        df = df.assign(text=["A", "b", "C", "d"])
+        expected = _make_survey()
+        expected.fit_transform(df)
+        grp = _make_survey(executor)
+        likert = grp["likert"]
+        a = likert["a"]
+        grp.fit_transform(df)
+        assert grp.names == expected.names
+        assert grp["likert"] is likert and likert["a"] is a
+        assert likert.standardised == approx(expected["likert"].standardised)
+        assert np.shares_memory(a.converted, likert.block)
+        assert grp["d"].mean == approx(expected["d"].mean)
+        assert list(grp["text"].converted) == ["a", "b", "c", "d"]
+
+    def test_bad_executor(self):
+        with pytest.raises(ValueError):
+            group.Group(name="survey", executor="gpu")
+
+
+class TestStats:
+    def test_stats(self, numericgroup, df):
+        stats = numericgroup.stats()
+        assert list(stats.index) == [
+            "mean", "std", "min", "max", "sem", "ci95", "n"
+        ]
+        assert list(stats.columns) == ["a", "b", "c", "d"]
+        x = df.values
+        assert stats.loc["mean"].values == approx(x.mean(axis=0))
+        assert stats.loc["std"].values == approx(x.std(axis=0))
+        assert stats.loc["n"].values == approx([4, 4, 4, 4])
+        for name in numericgroup.names:
+            _, values = numericgroup[name].stats()
+            assert stats[name].values == approx(np.array(values, float))
+
+    def test_percentiles(self, numericgroup, df):
+        stats = numericgroup.stats(percentiles=[25, 50])
+        assert stats.loc["p50"].values == approx(np.median(df.values, axis=0))
+        assert stats.loc["p25"].values == approx(
+            np.percentile(df.values, 25, axis=0)
+        )
+
+    def test_array(self, numericgroup):
+        stats = numericgroup.stats(typ="array")
+        assert stats.shape == (7, 4)
+
+
+class TestStatsBy:
+    def test_stats_by(self, numericgroup, df):
+        by = np.array(["x", "y", "x", "y"])
+        stats = numericgroup.stats_by(df, by)
+        assert list(stats.index.get_level_values(0).unique()) == ["x", "y"]
+        for segment in ["x", "y"]:
+            x = df.values[by == segment]
+            assert stats.loc[(segment, "mean")].values == approx(
+                x.mean(axis=0)
+            )
+            assert stats.loc[(segment, "std")].values == approx(
+                x.std(axis=0)
+            )
+            assert stats.loc[(segment, "max")].values == approx(
+                x.max(axis=0)
+            )
+
+    def test_item_stats_by(self, numericgroup, df):
+        df = df.assign(region=["n", "n", "s", np.nan])
+        stats = numericgroup["a"].stats_by(df, "region")
+        assert list(stats.index) == ["n", "s"]
+        assert stats["mean"].values == approx([1.5, 1.0])
+        assert stats["n"].values == approx([2, 1])
+
+    def test_means_by(self, numericgroup, df):
+        by = np.array([0, 0, 1, 1])
+        means = numericgroup.means_by(df, by)
+        expected = df.values.mean(axis=1)
+        assert means.values == approx([expected[:2].mean(),
+                                       expected[2:].mean()])
+
+
+class TestCounts:
+    def test_item_counts(self, numericgroup):
+        counts = numericgroup.item_counts()
+        assert counts[0] == {"item": "a", 1: 2, 2: 1, 3: 1}
+        assert counts[2] == numericgroup["c"].counts() | {"item": "c"}
+
+    def test_df(self, numericgroup, df):
+        table = numericgroup.item_counts(typ="df", as_percent=True)
+        assert list(table.columns) == [1, 2, 3, 4, 5]
+        assert table.loc["d", 4] == approx(50)
+        freq = numericgroup.frequencies()
+        assert freq["n"].values.sum(axis=1) == approx([4, 4, 4, 4])
+        assert freq["percent"].values == approx(table.values)
+
+    def test_item_counts_by(self, numericgroup, df):
+        table = numericgroup.item_counts_by(df, ["x", "y", "x", "y"],
+                                            as_percent=True)
+        assert table.loc[("x", "a")].tolist() == approx([100, 0, 0, 0, 0])
+        assert table.loc[("y", "b"), 1] == approx(50)
+
+
+class TestCollect:
+    def test_data_df_no_copy(self, numericgroup):
+        data = numericgroup.data_df()
+        assert list(data.columns) == ["a", "b", "c", "d", "fruit"]
+        standardised = numericgroup["a"].standardised.to_numpy()
+        assert np.shares_memory(data["a"].to_numpy(), standardised)
+
+    def test_data_df_index(self, df):
+        df.index = [10, 20, 30, 40]
+        grp = group.NumericGroup(name="fruit", pref="q_",
+                                 item_cls=item.NumericItem)
+        for name in ["a", "b"]:
+            grp.add_item(name=name, key=name)
+        grp.fit_transform(df)
+        assert list(grp.data_df().index) == [10, 20, 30, 40]
+        assert list(grp.data_df("raw").index) == [10, 20, 30, 40]
+
+    def test_data_table(self, numericgroup):
+        pytest.importorskip("pyarrow")
+        table = numericgroup.data_table()
+        assert table.column_names == ["a", "b", "c", "d", "fruit"]
+        assert table.column("fruit").to_numpy() == approx(
+            numericgroup.standardised
+        )
+
+    def test_data_table_ragged(self):
+        pytest.importorskip("pyarrow")
+        df = pd.DataFrame({"t": ["a, b", "c"]})
+        grp = group.Group(name="survey")
+        grp.add_item(name="t", key="t", cls=item.MultiCodedItem,
+                     converter=convert.Splitter([","], ragged=True))
+        grp.fit_transform(df)
+        table = grp.data_table()
+        assert table.column("t").to_pylist() == [["a", "b"], ["c"]]
+
+
+class TestCompact:
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_text_answers(self, compact):
+        df = pd.DataFrame({"q_a": ["Agree", "Disagree", "Agree"],
+                           "q_b": ["Disagree", "Agree", None]})
+        grp = group.NumericGroup(
+            name="likert", pref="q_", item_cls=item.NumericItem,
+            converter=convert.Replace({"Agree": 1, "Disagree": 0},
+                                      other_val=np.nan),
+            compact=compact,
+        )
+        for name in ["a", "b"]:
+            grp.add_item(name=name, key=name)
+        grp.fit_transform(df)
+        raw = grp.raw_data("array")
+        assert raw.tolist() == df.values.tolist()
+        assert grp.raw_fitted_data("array").shape == (3, 2)
+        converted = grp.converted_data("array")
+        assert converted.tolist()[:2] == [[1, 0], [0, 1]]
+        assert np.isnan(converted[2, 1])
+
+    def test_compact(self, df):
+        df = df.copy()
+        df.iloc[1, 2] = np.nan
+        grps = []
+        for compact in [False, True]:
+            grp = group.NumericGroup(name="fruit", pref="q_",
+                                     item_cls=item.NumericItem,
+                                     compact=compact)
+            for name in ["a", "b", "c", "d"]:
+                grp.add_item(name=name, key=name)
+            grp.fit_transform(df)
+            grps.append(grp)
+        full, small = grps
+        assert small["a"].converted.dtype == "UInt8"
+        assert small.standardised.dtype == np.float32
+        assert small.standardised == approx(full.standardised, rel=1e-5)
+        assert small.stats().values == approx(full.stats().values)
+        assert small.means() == approx(full.means())
+        usage = small.memory_usage()
+        assert list(usage.index) == ["fruit", "a", "b", "c", "d"]
+        assert usage.loc["a", "converted"] == 0
+        assert usage.loc["a", "raw"] < full.memory_usage().loc["a", "raw"]
@@ -9,7 +9,7 @@ import numpy as np
 import pandas as pd
 from pytest import approx
 
-from itemie.core import item
+from itemie.core import item, convert, stream
 
 
 @pytest.fixture
@@ -75,3 +75,129 @@ class TestNumericItem:
         print(res)
         assert res.values == approx(expected)
 
+
+
+@pytest.fixture
+def multicodeditem_b():
+    df = pd.DataFrame({"b": ["x, y", "z", "x, z, y"]})
+    splitter = convert.Splitter([","], ragged=True)
+    b = item.MultiCodedItem(name="banana", key="b", converter=splitter)
+    b.fit_transform(df)
+    return b
+
+
+class TestMultiCodedItem:
+    def test_linearised(self, multicodeditem_b):
+        lin_data, lin_mapping = multicodeditem_b.linearised()
+        assert list(lin_data) == ["x", "y", "z", "x", "z", "y"]
+        assert list(lin_mapping) == [0, 0, 1, 2, 2, 2]
+
+    def test_linearised_list(self, multicodeditem_b):
+        data = [["x", "y"], ["z"]]
+        lin_data, lin_mapping = multicodeditem_b.linearised(data)
+        assert list(lin_data) == ["x", "y", "z"]
+        assert list(lin_mapping) == [0, 0, 1]
+
+    def test_set_coded(self, multicodeditem_b):
+        df = multicodeditem_b.linearised_df()
+        df["code"] = ["p", "q", "q", "p", "q", "r"]
+        multicodeditem_b.set_coded(df, "code", exclude=["r"])
+        df_wide = multicodeditem_b.df_wide
+        assert list(df_wide.columns) == ["banana_p", "banana_q", "banana_count"]
+        assert df_wide["banana_count"].values == approx([2, 1, 2])
+        data = multicodeditem_b.data_df()
+        assert data["banana_p"].values == approx([1, 0, 1])
+
+    def test_set_coded_compact(self):
+        df = pd.DataFrame({"b": ["x, y", "z"]})
+        splitter = convert.Splitter([","])
+        b = item.MultiCodedItem(name="banana", key="b", converter=splitter,
+                                compact=True)
+        b.fit_transform(df)
+        coded = b.linearised_df()
+        coded["code"] = coded["text"]
+        b.set_coded(coded, "code")
+        data = b.data_df()
+        assert data["banana_x"].dtype == np.uint8
+        assert data["banana_count"].dtype == np.uint8
+        assert data["banana_count"].values == approx([2, 1])
+        assert b.memory_usage()["coded"] == 6
+
+
+class TestNumericItemPartialFit:
+    def test_partial_fit(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({"b": rng.integers(1, 8, 100).astype(float)})
+        df.loc[::9, "b"] = np.nan
+        whole = item.NumericItem(name="banana", key="b")
+        whole.fit(df)
+        chunked = item.NumericItem(name="banana", key="b")
+        for start in range(0, 100, 30):
+            chunked.partial_fit(df.iloc[start:start + 30])
+        for stat in ["mean", "std", "min", "max", "sem"]:
+            assert getattr(chunked, stat) == approx(getattr(whole, stat))
+
+
+class TestNumericItemViews:
+    def test_standardised_cached(self, numericitem_b):
+        first = numericitem_b.standardised
+        assert numericitem_b.standardised is first
+        df = pd.DataFrame({"b": [1.0, 2.0, 3.0, 4.0]})
+        numericitem_b.fit_transform(df)
+        second = numericitem_b.standardised
+        assert second is not first
+        assert len(second) == 4
+
+    def test_view_dtype(self):
+        df = pd.DataFrame({"b": [1.0, 2.0, 3.0]})
+        b = item.NumericItem(name="banana", key="b", view_dtype=np.float32)
+        b.fit_transform(df)
+        assert b.standardised.dtype == np.float32
+        assert b.normalised.values == approx([0, 0.5, 1])
+
+
+class TestPhraseCount:
+    @pytest.fixture
+    def df(self):
+        return pd.DataFrame({"p": ["red, blue", "blue", "green, blue, red"]})
+
+    def test_counts(self, df):
+        p = item.PhraseCount(name="colour", key="p",
+                             converter=convert.Splitter([","]),
+                             seq=["red", "pink"])
+        p.fit_transform(df)
+        assert p.counts == {"red": 2, "pink": 0, "blue": 3, "green": 1}
+
+    def test_merge(self, df):
+        splitter = convert.Splitter([","])
+        p = item.PhraseCount(name="colour", key="p", converter=splitter)
+        p.fit_transform(df.iloc[:2])
+        p.partial_fit(df.iloc[2:])
+        assert p.fitted_counts == {"blue": 3, "green": 1, "red": 2}
+        assert p.counts == {"blue": 2, "red": 1}
+
+    def test_stream(self, df):
+        p = item.PhraseCount(name="colour", key="p",
+                             converter=convert.Splitter([","]))
+        chunks = [df.iloc[:2], df.iloc[2:]]
+        stream.fit(p, chunks)
+        for _ in stream.transform(p, chunks):
+            pass
+        assert p.fitted_counts == {"blue": 3, "green": 1, "red": 2}
+        assert p.counts == {"blue": 1, "green": 1, "red": 1}
+
+    def test_transform_after_fit(self, df):
+        p = item.PhraseCount(name="colour", key="p",
+                             converter=convert.Splitter([","]))
+        p.fit_transform(df)
+        p.transform(df.iloc[1:2])
+        assert p.values() == {"blue": 1}
+        assert p.fitted_counts == {"blue": 3, "green": 1, "red": 2}
+
+    def test_top_k(self, df):
+        p = item.PhraseCount(name="colour", key="p",
+                             converter=convert.Splitter([","]), top_k=2)
+        p.fit_transform(df.iloc[:2])
+        p.partial_fit(df.iloc[2:])
+        assert list(p.fitted_counts) == ["blue", "red"]
+        assert p.fitted_counts["blue"] == 3
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.load."""
+import pytest
+import numpy as np
+import pandas as pd
+
+from itemie.core import item, group, load
+
+
+@pytest.fixture
+def survey():
+    grp = group.Group(name="survey")
+    likert = group.NumericGroup(name="likert", pref="q1_",
+                                item_cls=item.NumericItem)
+    likert.add_item(name="a", key="a")
+    likert.add_item(name="b", key="b")
+    grp.add(likert)
+    grp.add_item(name="age", key="age", cls=item.NumericItem)
+    grp.add_item(name="a2", key="q1_a", cls=item.NumericItem)
+    return grp
+
+
+@pytest.fixture
+def df():
+    cols = ["id", "q1_a", "q1_b", "q2_a", "age", "comments"]
+    data = np.arange(4 * len(cols)).reshape(4, -1).astype(float)
+    return pd.DataFrame(data, columns=cols)
+
+
+class TestLoad:
+    def test_columns(self, survey):
+        assert survey.columns() == ["q1_a", "q1_b", "age"]
+
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet", ".feather"])
+    def test_read(self, survey, df, tmp_path, suffix):
+        if suffix != ".csv":
+            pytest.importorskip("pyarrow")
+        fname = tmp_path / ("data" + suffix)
+        if suffix == ".csv":
+            df.to_csv(fname, index=False)
+        elif suffix == ".parquet":
+            df.to_parquet(fname)
+        else:
+            df.to_feather(fname)
+        loaded = load.read(fname, survey)
+        assert sorted(loaded.columns) == ["age", "q1_a", "q1_b"]
+        survey.fit_transform(loaded)
+        assert survey["age"].mean == df["age"].mean()
+
+    def test_bad_suffix(self, survey):
+        with pytest.raises(ValueError):
+            load.read("data.xlsx", survey)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.persist."""
+import pytest
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from itemie.core import item, group, convert, persist
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(3)
+    data = rng.integers(1, 8, size=(3000, 3)).astype(float)
+    df = pd.DataFrame(data, columns=["q_a", "q_b", "q_c"])
+    df["text"] = rng.choice(["x, y", "z", "y"], 3000)
+    return df
+
+
+@pytest.fixture
+def survey(df):
+    grp = group.Group(name="survey")
+    likert = group.NumericGroup(name="likert", pref="q_", matrix=True,
+                                item_cls=item.NumericItem)
+    for name in ["a", "b", "c"]:
+        likert.add_item(name=name, key=name)
+    grp.add(likert)
+    splitter = convert.Splitter([","], ragged=True)
+    text = grp.add_item(name="text", key="text", cls=item.MultiCodedItem,
+                        converter=splitter)
+    grp.fit_transform(df)
+    coded = text.linearised_df()
+    coded["code"] = coded["text"]
+    text.set_coded(coded, "code")
+    return grp
+
+
+class TestPersist:
+    def test_round_trip(self, survey, tmp_path):
+        persist.save(survey, tmp_path)
+        loaded = persist.load(tmp_path)
+        likert = loaded["likert"]
+        assert loaded.names == survey.names
+        assert likert.stats().values == approx(
+            survey["likert"].stats().values
+        )
+        assert likert.standardised == approx(survey["likert"].standardised)
+        assert loaded["text"].data_df().equals(survey["text"].data_df())
+
+    def test_memory_mapped(self, survey, tmp_path):
+        persist.save(survey, tmp_path)
+        loaded = persist.load(tmp_path)
+        block = loaded["likert"].block
+        assert isinstance(block.base, np.memmap)
+        assert np.shares_memory(loaded["likert"]["a"].converted, block)
+        assert len(list((tmp_path / "arrays").glob("*.npy"))) > 0
+
+    def test_no_mmap(self, survey, tmp_path):
+        persist.save(survey, tmp_path)
+        loaded = persist.load(tmp_path, mmap=False)
+        assert loaded["likert"].block.flags.writeable
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.ragged."""
+import pytest
+import numpy as np
+
+from itemie.core.ragged import Ragged
+
+
+@pytest.fixture
+def ragged():
+    return Ragged.from_lists([["a", "b"], [], ["c"]])
+
+
+class TestRagged:
+    def test_from_lists(self, ragged):
+        assert list(ragged.values) == ["a", "b", "c"]
+        assert list(ragged.offsets) == [0, 2, 2, 3]
+        assert ragged.tolist() == [["a", "b"], [], ["c"]]
+
+    def test_row_ids(self, ragged):
+        assert list(ragged.row_ids()) == [0, 0, 2]
+
+    def test_getitem(self, ragged):
+        assert len(ragged) == 3
+        assert ragged[0] == ["a", "b"]
+        assert ragged[1] == []
+
+    def test_bad_offsets(self):
+        with pytest.raises(ValueError):
+            Ragged(np.array(["a", "b"]), np.array([0, 1]))
+
+    def test_from_arrow(self):
+        pa = pytest.importorskip("pyarrow")
+        arr = pa.array([["x"], ["a", "b"], [], ["c"]])[1:]
+        ragged = Ragged.from_arrow(arr)
+        assert ragged.tolist() == [["a", "b"], [], ["c"]]
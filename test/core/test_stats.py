@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.stats."""
+import pytest
+import numpy as np
+from pytest import approx
+
+from itemie.core.stats import Moments, level_counts
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(50, 3))
+    x[::4, 1] = np.nan
+    return x
+
+
+class TestMoments:
+    def test_from_array(self, data):
+        m = Moments.from_array(data)
+        assert m.count == approx([50, 37, 50])
+        assert m.mean == approx(np.nanmean(data, axis=0))
+        assert m.std() == approx(np.nanstd(data, axis=0))
+        assert m.min == approx(np.nanmin(data, axis=0))
+        assert m.max == approx(np.nanmax(data, axis=0))
+
+    def test_merge(self, data):
+        whole = Moments.from_array(data)
+        parts = [Moments.from_array(data[i:i + 7]) for i in range(0, 50, 7)]
+        merged = parts[0]
+        for part in parts[1:]:
+            merged = merged + part
+        assert merged.count == approx(whole.count)
+        assert merged.mean == approx(whole.mean)
+        assert merged.m2 == approx(whole.m2)
+        assert merged.min == approx(whole.min)
+        assert merged.max == approx(whole.max)
+
+    def test_merge_empty(self, data):
+        m = Moments.from_array(data[:, 0])
+        merged = Moments.from_array(data[:0, 0]).merge(m)
+        assert merged.mean == approx(m.mean)
+        assert merged.std() == approx(m.std())
+
+    def test_sem(self):
+        x = np.array([1.0, 2.0, np.nan, 4.0])
+        m = Moments.from_array(x)
+        expected = np.nanstd(x, ddof=1) / np.sqrt(3)
+        assert m.sem == approx(expected)
+
+    def test_from_groups(self, data):
+        codes = np.arange(50) % 3
+        codes[::5] = -1
+        m = Moments.from_groups(data, codes, 4)
+        for g in range(3):
+            expected = Moments.from_array(data[codes == g])
+            assert m.count[g] == approx(expected.count)
+            assert m.mean[g] == approx(expected.mean)
+            assert m.m2[g] == approx(expected.m2)
+            assert m.min[g] == approx(expected.min)
+        assert m.count[3] == approx([0, 0, 0])
+        assert np.isnan(m.mean[3]).all()
+
+
+class TestLevelCounts:
+    def test_whole_numbers(self):
+        x = np.array([[1, 5], [2, 5], [2, np.nan], [np.nan, 1]])
+        levels, counts = level_counts(x)
+        assert levels == approx([1, 2, 5])
+        assert counts.tolist() == [[1, 2, 0, 1], [1, 0, 2, 1]]
+
+    def test_fractions(self):
+        levels, counts = level_counts([0.5, 0.25, 0.5, np.nan])
+        assert levels == approx([0.25, 0.5])
+        assert counts.tolist() == [[1, 2, 1]]
+
+    def test_segments(self):
+        x = np.array([1, 2, 2, 3, np.nan])
+        codes = np.array([0, 1, 1, -1, 0])
+        levels, counts = level_counts(x, codes, 2)
+        assert levels == approx([1, 2])
+        assert counts.tolist() == [[[1, 0, 1]], [[0, 2, 0]]]
+
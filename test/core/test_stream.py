@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.stream."""
+import pytest
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from itemie.core import item, group, stream
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(2)
+    data = rng.integers(1, 8, size=(50, 3)).astype(float)
+    df = pd.DataFrame(data, columns=["q_a", "q_b", "q_c"])
+    df["unused"] = "x"
+    return df
+
+
+def make_group():
+    grp = group.NumericGroup(name="fruit", pref="q_",
+                             item_cls=item.NumericItem)
+    for name in ["a", "b", "c"]:
+        grp.add_item(name=name, key=name)
+    return grp
+
+
+def chunks(df, size=15):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+class TestStream:
+    def test_columns(self):
+        assert make_group().columns() == ["q_a", "q_b", "q_c"]
+
+    def test_fit_transform(self, df):
+        expected = make_group()
+        expected.fit_transform(df)
+        grp = make_group()
+        stream.fit(grp, chunks(df))
+        assert grp.stats().values == approx(expected.stats().values)
+        out = pd.concat(stream.transform(grp, chunks(df)))
+        assert list(out.index) == list(range(50))
+        assert out.values == approx(expected.data_df().values)
+
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+    def test_files(self, df, tmp_path, suffix):
+        if suffix == ".parquet":
+            pytest.importorskip("pyarrow")
+        src = tmp_path / "src.csv"
+        df.to_csv(src, index=False)
+        grp = make_group()
+        stream.fit(grp, stream.read_csv_chunks(src, grp, chunksize=20))
+        frames = stream.transform(
+            grp, stream.read_csv_chunks(src, grp, chunksize=20)
+        )
+        out = tmp_path / ("out" + suffix)
+        stream.write(frames, out)
+        if suffix == ".csv":
+            result = pd.read_csv(out, index_col=0)
+        else:
+            result = pd.read_parquet(out)
+        expected = make_group()
+        expected.fit_transform(df)
+        assert result.values == approx(expected.data_df().values)
+
+    def test_read_parquet_chunks(self, df, tmp_path):
+        pytest.importorskip("pyarrow")
+        src = tmp_path / "src.parquet"
+        df.to_parquet(src)
+        grp = make_group()
+        frames = list(stream.read_parquet_chunks(src, grp, batch_size=20))
+        assert [len(f) for f in frames] == [20, 20, 10]
+        assert list(frames[0].columns) == ["q_a", "q_b", "q_c"]
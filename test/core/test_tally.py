@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Tests for itemie.core.tally."""
+from collections import Counter
+import numpy as np
+
+from itemie.core.tally import TopK, count_values
+
+
+def test_count_values():
+    counts = count_values(["a", "b", "a", np.nan])
+    assert counts == Counter({"a": 2, "b": 1})
+
+
+class TestTopK:
+    def test_exact_when_small(self):
+        top = TopK.from_values(list("aabbbc"), 5)
+        assert top.counts() == {"b": 3, "a": 2, "c": 1}
+        assert top.floor == 0
+
+    def test_chunksize(self):
+        values = np.array(list("abcdefgh" * 3 + "a" * 20), dtype=object)
+        top = TopK.from_values(values, 2, chunksize=5)
+        assert len(top) == 2
+        assert next(iter(top.counts())) == "a"
+        exact = count_values(values)
+        for value, count in top.counts().items():
+            assert count - top.errors()[value] <= exact[value] <= count
+
+    def test_merge_bounds(self):
+        rng = np.random.default_rng(0)
+        values = rng.zipf(1.5, size=5000) % 200
+        chunks = np.array_split(values, 7)
+        top = TopK.from_values(chunks[0], 20)
+        for chunk in chunks[1:]:
+            top.update(chunk)
+        exact = count_values(values)
+        errors = top.errors()
+        for value, count in top.counts().items():
+            assert count - errors[value] <= exact[value] <= count
+        heavy = [v for v, c in exact.items() if c > top.floor]
+        assert set(heavy) <= set(top.counts())
+        assert exact.most_common(1)[0][0] == next(iter(top.counts()))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Tests for importing itemie."""
+import subprocess
+import sys
+
+
+HEAVY = ["spacy", "gensim", "pyLDAvis", "wordcloud", "textblob"]
+
+
+def _loaded_modules(statement):
+    code = statement + "; import sys; print(' '.join(sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return set(out.stdout.split())
+
+
+class TestLazyImport:
+    def test_import_core(self):
+        modules = _loaded_modules("import itemie.core")
+        for name in HEAVY:
+            assert name not in modules
+
+    def test_import_analyse(self):
+        modules = _loaded_modules("import itemie; itemie.analyse.topic")
+        assert "itemie.analyse.topic" in modules
+        for name in HEAVY:
+            assert name not in modules